@@ -1,18 +1,26 @@
 # analysis.py
 
 import os
+import sys
 import csv
+import json
+import html
+import time
 import praw
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
 from transformers import pipeline
+from heatmap_store import get_heatmap_store, MAX_REPLY_CHARS
 import warnings
 warnings.filterwarnings("ignore")
 
 load_dotenv()
 
+# Part of every stored heatmap's key; bump "version" when the PNG rendering changes.
+HEATMAP_SETTINGS = {"renderer": "seaborn", "cmap": "coolwarm", "dpi": 150, "version": 1}
+
 def initialize_reddit():
     """Initializes and returns an authenticated PRAW instance."""
     try:
@@ -76,48 +84,118 @@ def get_composite_score(results):
     except Exception:
         return 0.0
 
-def visualize_reply_sentiment(reply_text, sentiment_analyzer, filename="sentiment_heatmap.png"):
-    """Creates and saves a heatmap visualizing word-level sentiment contribution."""
+def compute_word_importance(reply_text, sentiment_analyzer):
+    """
+    Scores how much each word contributes to the reply's overall sentiment.
+    Returns (words, importance_scores, base_score), or None if the reply is empty.
+    """
     words = reply_text.split()
-    if not words: 
+    if not words:
         return None
 
-    try:
-        base_results = sentiment_analyzer(reply_text)
-        base_score = get_composite_score(base_results)
-        word_importance_scores = []
-        for i in range(len(words)):
-            temp_text = ' '.join(words[:i] + words[i+1:])
-            if not temp_text.strip(): 
-                word_importance_scores.append(0.0)
-                continue
-            
-            temp_results = sentiment_analyzer(temp_text)
-            temp_score = get_composite_score(temp_results)
-            importance = base_score - temp_score
-            word_importance_scores.append(importance)
+    base_results = sentiment_analyzer(reply_text)
+    base_score = get_composite_score(base_results)
+    word_importance_scores = []
+    for i in range(len(words)):
+        temp_text = ' '.join(words[:i] + words[i+1:])
+        if not temp_text.strip():
+            word_importance_scores.append(0.0)
+            continue
 
-        if not word_importance_scores: 
-            return base_score
-        
-        plt.figure(figsize=(max(len(words) * 0.9, 8), 2.5))
-        scores_to_plot = np.array(word_importance_scores).reshape(1, -1)
-        
-        sns.heatmap(
-            scores_to_plot, annot=np.array(words).reshape(1, -1), fmt='',
-            cmap="coolwarm", linewidths=.5, cbar=True,
-            cbar_kws={'label': 'Sentiment Impact'}, xticklabels=False,
-            yticklabels=False, annot_kws={"size": 10}
-        )
-        
-        plt.title("Sentiment Analysis", fontsize=12)
-        plt.tight_layout()
-        plt.savefig(filename, dpi=150, bbox_inches='tight')
-        plt.close()
-        return base_score
-        
-    except Exception:
-        return None
+        temp_results = sentiment_analyzer(temp_text)
+        temp_score = get_composite_score(temp_results)
+        importance = base_score - temp_score
+        word_importance_scores.append(importance)
+
+    return words, word_importance_scores, base_score
+
+def render_heatmap_png(words, word_importance_scores, filename="sentiment_heatmap.png", dpi=150, cmap="coolwarm"):
+    """Draws the word-level heatmap with seaborn and saves it as a PNG (for reports)."""
+    # Imported lazily so the interactive dashboard never pays for matplotlib.
+    import numpy as np
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(max(len(words) * 0.9, 8), 2.5))
+    scores_to_plot = np.array(word_importance_scores).reshape(1, -1)
+
+    sns.heatmap(
+        scores_to_plot, annot=np.array(words).reshape(1, -1), fmt='',
+        cmap=cmap, linewidths=.5, cbar=True,
+        cbar_kws={'label': 'Sentiment Impact'}, xticklabels=False,
+        yticklabels=False, annot_kws={"size": 10}
+    )
+
+    plt.title("Sentiment Analysis", fontsize=12)
+    plt.tight_layout()
+    plt.savefig(filename, dpi=dpi, bbox_inches='tight')
+    plt.close()
+    return filename
+
+def render_heatmap_cached(reply_text, words, word_importance_scores):
+    """Returns the path of the reply's heatmap PNG from the artifact store, rendering it only if new."""
+    def render(path):
+        render_heatmap_png(words, word_importance_scores, path,
+                           dpi=HEATMAP_SETTINGS["dpi"], cmap=HEATMAP_SETTINGS["cmap"])
+    return get_heatmap_store().get_or_create(reply_text, word_importance_scores, HEATMAP_SETTINGS, render)
+
+def build_heatmap_html(words, word_importance_scores, title="Sentiment Analysis"):
+    """
+    Returns a self-contained HTML snippet that draws the word-level heatmap in the browser.
+    Only the words and their scores are embedded; the colouring is done client-side.
+    """
+    payload = json.dumps({"words": words, "scores": [round(float(s), 4) for s in word_importance_scores]})
+    payload = payload.replace("<", "\\u003c")  # Keep reply text from closing the <script> tag
+    return f"""
+<div class="heatmap">
+  <div class="heatmap-title">{html.escape(title)}</div>
+  <div class="heatmap-row"></div>
+  <svg class="heatmap-legend" width="220" height="28"></svg>
+</div>
+<style>
+  .heatmap {{ font-family: sans-serif; font-size: 14px; }}
+  .heatmap-title {{ font-weight: 600; margin-bottom: 6px; }}
+  .heatmap-row {{ display: flex; flex-wrap: wrap; gap: 2px; }}
+  .heatmap-row span {{ padding: 6px 8px; border-radius: 3px; cursor: default; }}
+</style>
+<script>
+(function() {{
+  const data = {payload};
+  const root = document.currentScript.previousElementSibling.previousElementSibling;
+  const maxAbs = Math.max(1e-6, ...data.scores.map(Math.abs));
+  // Diverging blue-white-red scale, matching seaborn's "coolwarm".
+  function colour(v) {{
+    const t = Math.max(-1, Math.min(1, v / maxAbs));
+    const from = t < 0 ? [59, 76, 192] : [180, 4, 38];
+    const a = Math.abs(t);
+    const c = [0, 1, 2].map(i => Math.round(221 + (from[i] - 221) * a));
+    return "rgb(" + c.join(",") + ")";
+  }}
+  const row = root.querySelector(".heatmap-row");
+  data.words.forEach(function(word, i) {{
+    const span = document.createElement("span");
+    span.textContent = word;
+    span.style.background = colour(data.scores[i]);
+    span.style.color = Math.abs(data.scores[i]) / maxAbs > 0.6 ? "#fff" : "#000";
+    span.title = "Sentiment impact: " + data.scores[i].toFixed(3);
+    row.appendChild(span);
+  }});
+  const svg = root.querySelector(".heatmap-legend");
+  const ns = "http://www.w3.org/2000/svg";
+  for (let i = 0; i <= 20; i++) {{
+    const rect = document.createElementNS(ns, "rect");
+    rect.setAttribute("x", i * 8); rect.setAttribute("y", 4);
+    rect.setAttribute("width", 8); rect.setAttribute("height", 10);
+    rect.setAttribute("fill", colour((i - 10) / 10 * maxAbs));
+    svg.appendChild(rect);
+  }}
+  const label = document.createElementNS(ns, "text");
+  label.setAttribute("x", 172); label.setAttribute("y", 13); label.setAttribute("font-size", 10);
+  label.textContent = "±" + maxAbs.toFixed(2);
+  svg.appendChild(label);
+}})();
+</script>
+"""
 
 def get_sentiment_emoji(score):
     """Returns an emoji representation of the sentiment score."""
@@ -145,9 +223,12 @@ def analyze_comment_performance(reddit, sentiment_analyzer, comment_id):
             if reply.author and reply.author.name == reddit.user.me().name:
                 continue
 
-            reply_text = reply.body[:512]
-            heatmap_filename = f"heatmap_{comment_id}_reply_{i+1}.png"
-            overall_score = visualize_reply_sentiment(reply_text, sentiment_analyzer, heatmap_filename)
+            reply_text = reply.body[:MAX_REPLY_CHARS]
+            try:
+                words, scores, overall_score = compute_word_importance(reply_text, sentiment_analyzer)
+                render_heatmap_cached(reply_text, words, scores)
+            except Exception:
+                overall_score = None
             
             if overall_score is not None:
                 emoji = get_sentiment_emoji(overall_score)
@@ -156,7 +237,116 @@ def analyze_comment_performance(reddit, sentiment_analyzer, comment_id):
     except Exception as e:
         print(f"❌ Error analyzing {comment_id}: {e}")
 
+# --- Bulk backfill ---
+
+BACKFILL_FILE = 'sentiment_backfill.csv'
+_worker_pipeline = None
+
+def _init_backfill_worker(torch_threads):
+    """Pins torch threads and loads a private model copy in each worker process."""
+    global _worker_pipeline
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    _worker_pipeline = initialize_sentiment_pipeline()
+
+def _score_bucket(bucket):
+    """Scores one length bucket of (comment_id, reply_id, text) in a single batch."""
+    texts = [text for _, _, text in bucket]
+    results = _worker_pipeline(texts, batch_size=len(texts), truncation=True)
+    return [
+        (comment_id, reply_id, get_composite_score(result), result['label'])
+        for (comment_id, reply_id, _), result in zip(bucket, results)
+    ]
+
+def collect_pending_replies(reddit, tracking_file='tracked_comments.csv', output_file=BACKFILL_FILE):
+    """Returns (comment_id, reply_id, text) for every reply not yet in the backfill file."""
+    done = set()
+    if os.path.exists(output_file):
+        with open(output_file, 'r', encoding='utf-8') as f:
+            done = {row['reply_id'] for row in csv.DictReader(f)}
+
+    with open(tracking_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        comment_ids = [row[0] for row in reader if row]
+
+    bot_name = reddit.user.me().name
+    pending = []
+    for comment_id in comment_ids:
+        try:
+            comment = reddit.comment(id=comment_id)
+            comment.refresh()
+            for reply in comment.replies.list():
+                if reply.id in done or (reply.author and reply.author.name == bot_name):
+                    continue
+                pending.append((comment_id, reply.id, reply.body[:MAX_REPLY_CHARS]))
+        except Exception as e:
+            print(f"❌ Error fetching replies for {comment_id}: {e}")
+    return pending
+
+def backfill_sentiment(reddit, tracking_file='tracked_comments.csv', output_file=BACKFILL_FILE,
+                       workers=None, bucket_size=32):
+    """
+    Scores every pending reply in bulk and appends the results to output_file.
+    Replies are sorted by length and batched in buckets to minimise padding, and the
+    buckets are sharded across a process pool with one model per worker.
+    """
+    pending = collect_pending_replies(reddit, tracking_file, output_file)
+    if not pending:
+        print("✅ Nothing to backfill.")
+        return 0
+
+    pending.sort(key=lambda item: len(item[2]))
+    buckets = [pending[i:i + bucket_size] for i in range(0, len(pending), bucket_size)]
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(workers or cpu_count, len(buckets)))
+    torch_threads = max(1, cpu_count // workers)
+    print(f"🚚 Backfilling {len(pending)} replies in {len(buckets)} buckets on {workers} workers "
+          f"({torch_threads} torch threads each)...")
+
+    file_exists = os.path.exists(output_file)
+    start = time.monotonic()
+    scored = 0
+    context = multiprocessing.get_context("spawn")
+    with open(output_file, 'a', newline='', encoding='utf-8') as f, \
+            ProcessPoolExecutor(workers, mp_context=context, initializer=_init_backfill_worker,
+                                initargs=(torch_threads,)) as executor:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(['comment_id', 'reply_id', 'sentiment_score', 'label', 'analyzed_at'])
+        futures = [executor.submit(_score_bucket, bucket) for bucket in buckets]
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"❌ A bucket failed to score: {e}")
+                continue
+            analyzed_at = datetime.now().isoformat()
+            writer.writerows([(*result, analyzed_at) for result in results])
+            f.flush()
+
+            scored += len(results)
+            elapsed = time.monotonic() - start
+            rate = scored / elapsed if elapsed else 0.0
+            eta = (len(pending) - scored) / rate if rate else 0.0
+            print(f"   {scored}/{len(pending)} replies | {rate:.1f} texts/s | ETA {eta:.0f}s")
+
+    print(f"✅ Backfilled {scored} replies to {output_file} in {time.monotonic() - start:.1f}s")
+    return scored
+
 if __name__ == "__main__":
+    if "--backfill" in sys.argv:
+        reddit_instance = initialize_reddit()
+        if not reddit_instance:
+            exit(1)
+        workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+        try:
+            backfill_sentiment(reddit_instance, workers=workers)
+        except FileNotFoundError:
+            print("❌ 'tracked_comments.csv' not found. Run main.py first.")
+        exit(0)
+
     reddit_instance = initialize_reddit()
     sentiment_pipeline = initialize_sentiment_pipeline()
 
@@ -0,0 +1,64 @@
+# benchmark_records.py
+
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+from records import GeneratedReply, import_json, write_records, read_records
+
+def measure(load, repeat=3):
+    """Returns (best seconds, retained bytes) for loading a dataset with load()."""
+    # Time without tracemalloc, which slows down every allocation
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = load()
+        seconds = min(seconds, time.perf_counter() - start)
+        del data
+
+    tracemalloc.start()
+    data = load()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return seconds, retained
+
+def run_benchmark(source="posts_with_replies.json", count=20000):
+    """Compares the JSON files against slotted records in msgpack, scaled up to count posts."""
+    template = import_json(source, GeneratedReply)
+    if not template:
+        print(f"❌ {source} has no posts to benchmark with.")
+        return
+    records = []
+    for i in range(count):
+        record = GeneratedReply.from_dict(template[i % len(template)].to_dict())
+        record.id = f"{record.id}_{i}"
+        records.append(record)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "posts.json")
+        msgpack_path = os.path.join(tmp, "posts.msgpack")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump([record.to_dict() for record in records], f, indent=4, ensure_ascii=False)
+        write_records(msgpack_path, records, GeneratedReply)
+
+        def load_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        json_seconds, json_bytes = measure(load_json)
+        msgpack_seconds, msgpack_bytes = measure(lambda: read_records(msgpack_path))
+        json_size = os.path.getsize(json_path)
+        msgpack_size = os.path.getsize(msgpack_path)
+
+    print(f"📊 Loading {count} posts with replies (based on {source})")
+    print(f"{'':<22}{'file size':>12}{'load time':>12}{'memory':>12}")
+    print(f"{'JSON dicts':<22}{json_size / 1024:>10.0f}KB{json_seconds * 1000:>10.1f}ms{json_bytes / 1024 ** 2:>10.1f}MB")
+    print(f"{'msgpack records':<22}{msgpack_size / 1024:>10.0f}KB{msgpack_seconds * 1000:>10.1f}ms{msgpack_bytes / 1024 ** 2:>10.1f}MB")
+    print(f"✅ {json_size / msgpack_size:.1f}x smaller on disk, {json_seconds / msgpack_seconds:.1f}x faster to load, "
+          f"{json_bytes / msgpack_bytes:.1f}x less memory")
+
+if __name__ == "__main__":
+    run_benchmark(count=int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -5,6 +5,7 @@ import csv
 import praw
 import streamlit as st
 from dotenv import load_dotenv
+from heatmap_store import get_heatmap_store, MAX_REPLY_CHARS
 load_dotenv()
 @st.cache_resource
 def initialize_reddit():
@@ -72,11 +73,11 @@ else:
                             st.markdown("---")
                             st.write(f"**Reply from /u/{reply.author.name if reply.author else '[deleted]'}:**")
                             st.write(f"> {reply.body}")
-                            heatmap_filename = f"heatmap_adv_{comment_id}_reply_{i+1}.png"
-                            if os.path.exists(heatmap_filename):
+                            heatmap_filename = get_heatmap_store().find_by_text(reply.body[:MAX_REPLY_CHARS])
+                            if heatmap_filename:
                                 st.image(heatmap_filename, caption=f"Sentiment Heatmap for Reply #{i+1}")
                             else:
-                                st.warning(f"Heatmap not found: {heatmap_filename}. Run analysis.py to generate it.")
+                                st.warning(f"No heatmap stored for reply #{i+1} yet. Run analysis.py to generate it.")
 
             except Exception as e:
                 st.error(f"Could not fetch data for comment {comment_id}: {e}")
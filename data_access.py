@@ -0,0 +1,93 @@
+# data_access.py
+
+import os
+import csv
+import json
+import streamlit as st
+
+# Parsed datasets are cached per (path, mtime, size), so a new file written by the
+# pipeline gets a fresh cache key on the very next rerun. Entries are shared by every
+# session in the process; callers must treat returned objects as read-only.
+CACHE_ENTRIES = 8
+
+def file_signature(filename):
+    """Returns (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _index_json_array(filename, mtime_ns, size):
+    """
+    Scans a JSON array once and returns the (start, end) byte offsets of each element.
+    Elements are decoded one at a time and discarded, so only the offsets stay in memory.
+    Only the signature arguments are used as the cache key.
+    """
+    # newline="" keeps CRLF line endings, so character and byte offsets stay in step
+    with open(filename, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+
+    decoder = json.JSONDecoder()
+    offsets = []
+    pos = len(text) - len(text.lstrip(" \t\r\n"))
+    if not text.startswith("[", pos):
+        raise ValueError(f"{filename} is not a JSON list")
+    pos += 1
+    byte_pos = len(text[:pos].encode("utf-8"))
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            byte_pos += 1
+            pos += 1
+        if pos >= len(text):
+            raise ValueError(f"Unterminated JSON array in {filename}")
+        if text[pos] == "]":
+            return offsets
+        _, end = decoder.raw_decode(text, pos)
+        length = len(text[pos:end].encode("utf-8"))
+        offsets.append((byte_pos, byte_pos + length))
+        byte_pos += length
+        pos = end
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _parse_tracked_ids(filename, mtime_ns, size):
+    """Reads the comment IDs (first column) from the tracking CSV."""
+    with open(filename, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None) # Skip header
+        return [row[0] for row in reader if row]
+
+def count_records(filename):
+    """Returns the number of records in a JSON array file, or None if it is missing or corrupted."""
+    signature = file_signature(filename)
+    if signature is None:
+        return None
+    try:
+        return len(_index_json_array(filename, *signature))
+    except (OSError, ValueError):
+        return None
+
+def read_record(filename, index):
+    """Reads a single element of a JSON array file by seeking to its indexed offset."""
+    signature = file_signature(filename)
+    if signature is None:
+        return None
+    try:
+        start, end = _index_json_array(filename, *signature)[index]
+        with open(filename, "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start).decode("utf-8"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+def load_tracked_comment_ids(filename="tracked_comments.csv"):
+    """Returns the tracked comment IDs, or [] if the CSV is missing or unreadable."""
+    signature = file_signature(filename)
+    if signature is None:
+        return []
+    try:
+        return _parse_tracked_ids(filename, *signature)
+    except (OSError, csv.Error):
+        return []
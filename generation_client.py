@@ -0,0 +1,195 @@
+# generation_client.py
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+def percentile(values, pct):
+    """Returns the nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+class CircuitBreaker:
+    """Opens after repeated consecutive failures and lets a trial call through after a cooldown."""
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        # Half-open: allow a trial request once the cooldown has passed
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+class HedgedGenerationClient:
+    """
+    Sends prompts to a primary model and hedges slow calls to a fallback.
+
+    models is an ordered dict of name -> model, where each model exposes
+    generate_content(prompt, request_options={"timeout": seconds}) returning an
+    object with a .text attribute (the Gemini GenerativeModel interface, or any
+    local fake for testing). If the
+    primary has not answered within the hedge_percentile of recent call
+    latencies, the same prompt is sent to the next available model (or the
+    primary again if there is no fallback) and the first answer wins. A failed
+    call immediately moves on to the next model, and models that keep failing
+    are skipped by their circuit breaker until the cooldown passes.
+
+    In-flight SDK calls cannot be interrupted, so the losing request is
+    cancelled if it has not started yet and otherwise its answer is discarded.
+    Every call is given the time left until the request's deadline as its SDK
+    timeout, so abandoned calls free their worker by then at the latest; the
+    pool leaves room for several requests' worth of them.
+    """
+
+    def __init__(self, models, hedge_percentile=95, default_hedge_delay=2.0, min_hedge_delay=0.2,
+                 window=200, timeout=60.0, failure_threshold=3, reset_timeout=60.0, max_workers=32):
+        self.models = dict(models)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.timeout = timeout
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name in self.models}
+        self.call_latencies = deque(maxlen=window)
+        self.request_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges_fired = 0
+        self.timeouts = 0
+        self.failed_requests = 0
+        self.failures = {name: 0 for name in self.models}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before firing a hedged request."""
+        with self._lock:
+            samples = list(self.call_latencies)
+        if len(samples) < 10:
+            return self.default_hedge_delay
+        return max(percentile(samples, self.hedge_percentile), self.min_hedge_delay)
+
+    def _call(self, name, prompt, deadline):
+        start = time.monotonic()
+        try:
+            timeout = max(deadline - start, 0.1)
+            text = self.models[name].generate_content(prompt, request_options={"timeout": timeout}).text.strip()
+        except Exception:
+            with self._lock:
+                self.breakers[name].record_failure()
+                self.failures[name] += 1
+            raise
+        with self._lock:
+            self.breakers[name].record_success()
+            self.call_latencies.append(time.monotonic() - start)
+        return text
+
+    def _candidates(self):
+        with self._lock:
+            available = [name for name in self.models if self.breakers[name].allow()]
+        if not available:
+            raise RuntimeError("All generation models are unavailable (circuit open).")
+        return available
+
+    def generate(self, prompt):
+        """Returns the reply text from whichever model answers first."""
+        candidates = self._candidates()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._lock:
+            self.requests += 1
+
+        # Hedge to the next model, or duplicate to the primary if it is the only one
+        queue = candidates[1:] or [candidates[0]]
+        in_flight = {self._executor.submit(self._call, candidates[0], prompt, deadline): candidates[0]}
+        hedge_at = start + self.hedge_delay()
+        hedged = False
+        last_error = None
+
+        try:
+            while in_flight:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._record_failure(start, timed_out=True)
+                    raise TimeoutError(f"No model answered within {self.timeout:.1f}s.")
+                wait_for = deadline - now if hedged or not queue else min(hedge_at, deadline) - now
+                done, _ = wait(in_flight, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    in_flight.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        last_error = e
+                        # Fail over straight away instead of waiting for the hedge delay
+                        if queue and not in_flight:
+                            name = queue.pop(0)
+                            in_flight[self._executor.submit(self._call, name, prompt, deadline)] = name
+                        continue
+                    with self._lock:
+                        self.request_latencies.append(time.monotonic() - start)
+                    return text
+
+                if not done and not hedged and queue:
+                    name = queue.pop(0)
+                    in_flight[self._executor.submit(self._call, name, prompt, deadline)] = name
+                    hedged = True
+                    with self._lock:
+                        self.hedges_fired += 1
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        self._record_failure(start, timed_out=False)
+        raise last_error
+
+    def _record_failure(self, start, timed_out):
+        # Failed requests count towards the latency percentiles: they are the tail
+        with self._lock:
+            self.request_latencies.append(time.monotonic() - start)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.failed_requests += 1
+
+    def stats(self):
+        """
+        Returns request count, hedges fired, timed-out and failed requests, latency
+        percentiles (over every request, including timeouts and failures) and
+        per-model failures.
+        """
+        with self._lock:
+            latencies = list(self.request_latencies)
+            return {
+                "requests": self.requests,
+                "hedges_fired": self.hedges_fired,
+                "timeouts": self.timeouts,
+                "failed_requests": self.failed_requests,
+                "p50_latency": percentile(latencies, 50),
+                "p99_latency": percentile(latencies, 99),
+                "failures": dict(self.failures),
+                "open_circuits": [name for name, breaker in self.breakers.items() if breaker.is_open],
+            }
+
+    def close(self):
+        """Stops the worker pool without waiting for discarded in-flight calls."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,195 @@
+# heatmap_store.py
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from file_lock import locked
+
+STORE_DIR = "heatmaps"
+MANIFEST_NAME = "manifest.json"
+MAX_STORE_BYTES = 100 * 1024 * 1024
+# Replies are scored, keyed and looked up by their first MAX_REPLY_CHARS characters.
+MAX_REPLY_CHARS = 512
+# Last-used times from cache hits are written back in batches, not on every hit.
+TOUCH_FLUSH_COUNT = 50
+TOUCH_FLUSH_SECONDS = 60
+
+def text_hash(reply_text):
+    """Returns the hash used to look up the latest render of a reply text."""
+    return hashlib.sha256(reply_text.encode("utf-8")).hexdigest()
+
+def artifact_key(reply_text, scores, settings):
+    """Returns the content address of a render: a hash of the text, scores and render settings."""
+    payload = json.dumps({
+        "text": reply_text,
+        "scores": [round(float(score), 4) for score in scores],
+        "settings": settings,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class HeatmapStore:
+    """
+    Size-bounded store of rendered heatmap PNGs, addressed by artifact_key().
+
+    The manifest maps artifact keys to files (with their size and last-used time)
+    and reply text hashes to their latest artifact, so lookups never scan the
+    directory. Several processes can share a store: the manifest is reloaded
+    whenever it changes on disk, and every write re-reads and merges it under a
+    file lock. Once the total size exceeds max_bytes, the least recently used
+    files are deleted.
+    """
+
+    def __init__(self, directory=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self._signature = None
+        self.artifacts = {}
+        self.by_text = {}
+        self._touched = {}
+        self._last_flush = time.time()
+        os.makedirs(directory, exist_ok=True)
+        with locked(self.manifest_path):
+            if not os.path.exists(self.manifest_path):
+                self._adopt_untracked_files()
+                self._save_manifest()
+            self._reload_if_changed()
+
+    def _manifest_signature(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload_if_changed(self):
+        """Reloads the manifest if another process (or instance) rewrote it. O(1) when unchanged."""
+        signature = self._manifest_signature()
+        if signature == self._signature:
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {"artifacts": {}, "by_text": {}}
+        self.artifacts = manifest["artifacts"]
+        self.by_text = manifest["by_text"]
+        self._signature = signature
+
+    def _save_manifest(self):
+        """Writes the manifest. Call only while holding the manifest file lock."""
+        for key, last_used in self._touched.items():
+            if key in self.artifacts:
+                self.artifacts[key]["last_used"] = max(self.artifacts[key]["last_used"], last_used)
+        self._touched = {}
+        self._last_flush = time.time()
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"artifacts": self.artifacts, "by_text": self.by_text}, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._signature = self._manifest_signature()
+
+    def _adopt_untracked_files(self):
+        """Brings PNGs written before the manifest existed (e.g. heatmap_*.png) under the size cap."""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                self.artifacts[f"untracked:{entry.name}"] = {
+                    "file": entry.name, "size": stat.st_size, "last_used": stat.st_mtime,
+                }
+        self._evict()
+
+    def _path(self, entry):
+        return os.path.join(self.directory, entry["file"])
+
+    def get(self, key):
+        """Returns the file path for an artifact key, or None if it is not stored."""
+        with self._lock:
+            self._reload_if_changed()
+            entry = self.artifacts.get(key)
+            if entry is None:
+                return None
+            path = self._path(entry)
+            if not os.path.exists(path):
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_COUNT or time.time() - self._last_flush >= TOUCH_FLUSH_SECONDS:
+                self.flush()
+            return path
+
+    def find_by_text(self, reply_text):
+        """Returns the latest stored render for a reply text, or None."""
+        with self._lock:
+            self._reload_if_changed()
+            key = self.by_text.get(text_hash(reply_text))
+        return self.get(key) if key else None
+
+    def flush(self):
+        """Writes pending last-used times back to the manifest."""
+        with self._lock:
+            if not self._touched:
+                return
+            with locked(self.manifest_path):
+                self._reload_if_changed()
+                self._save_manifest()
+
+    def get_or_create(self, reply_text, scores, settings, render):
+        """
+        Returns the path of the render for (reply_text, scores, settings).
+        If it is not stored yet, render(path) is called to draw it first.
+        """
+        key = artifact_key(reply_text, scores, settings)
+        path = self.get(key)
+        if path:
+            if self.by_text.get(text_hash(reply_text)) != key:
+                with self._lock, locked(self.manifest_path):
+                    self._reload_if_changed()
+                    self.by_text[text_hash(reply_text)] = key
+                    self._save_manifest()
+            return path
+
+        filename = f"{key[:32]}.png"
+        path = os.path.join(self.directory, filename)
+        render(path)
+        with self._lock, locked(self.manifest_path):
+            # Merge with whatever other processes stored in the meantime
+            self._reload_if_changed()
+            self.artifacts[key] = {"file": filename, "size": os.path.getsize(path), "last_used": time.time()}
+            self.by_text[text_hash(reply_text)] = key
+            self._evict()
+            self._save_manifest()
+        return path
+
+    def _evict(self):
+        """Deletes least recently used files until the store fits max_bytes."""
+        for key in [key for key, entry in self.artifacts.items() if not os.path.exists(self._path(entry))]:
+            del self.artifacts[key]
+        total_bytes = sum(entry["size"] for entry in self.artifacts.values())
+        if total_bytes > self.max_bytes:
+            last_used = lambda key: max(self.artifacts[key]["last_used"], self._touched.get(key, 0))
+            for key in sorted(self.artifacts, key=last_used)[:-1]:
+                if total_bytes <= self.max_bytes:
+                    break
+                entry = self.artifacts.pop(key)
+                total_bytes -= entry["size"]
+                try:
+                    os.remove(self._path(entry))
+                except FileNotFoundError:
+                    pass
+        self.by_text = {h: key for h, key in self.by_text.items() if key in self.artifacts}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_heatmap_store():
+    """Returns the process-wide heatmap store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HeatmapStore()
+            atexit.register(_store.flush)
+        return _store
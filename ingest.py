@@ -0,0 +1,184 @@
+# ingest.py
+
+import os
+import sys
+import json
+import time
+from collections import deque
+from scraper import _create_reddit
+
+STATE_FILE = "ingest_state.json"
+QUEUE_FILE = "ingest_queue.jsonl"
+OFFSET_FILE = "ingest_queue.offset"
+
+MAX_SEEN_IDS = 10000      # Seen-ID index is compacted to the most recent IDs
+CURSOR_GRACE_SECONDS = 3600 # Posts older than cursor - grace are never re-emitted
+
+class SeenIndex:
+    """Set of recently seen post IDs that keeps only the newest max_size entries."""
+
+    def __init__(self, ids=(), max_size=MAX_SEEN_IDS):
+        self.max_size = max_size
+        self._order = deque(ids)
+        self._ids = set(self._order)
+        self.compact()
+
+    def __contains__(self, post_id):
+        return post_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, post_id):
+        if post_id not in self._ids:
+            self._ids.add(post_id)
+            self._order.append(post_id)
+
+    def compact(self):
+        while len(self._order) > self.max_size:
+            self._ids.discard(self._order.popleft())
+
+    def to_list(self):
+        return list(self._order)
+
+def _write_json_atomic(data, filename):
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_filename, filename)
+
+def load_ingest_state(filename=STATE_FILE):
+    """Loads the checkpointed cursor, seen IDs and written count."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"cursor": None, "seen_ids": [], "written": 0}
+
+def load_queue_offset(filename=OFFSET_FILE):
+    """Returns how far downstream consumers have read the queue: (records, byte offset)."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            offset = json.load(f)
+        return offset["consumed"], offset["byte_offset"]
+    except FileNotFoundError:
+        return 0, 0
+
+def _submission_to_post(submission):
+    return {
+        "id": submission.id,
+        "title": submission.title,
+        "text": submission.selftext,
+        "score": submission.score,
+        "url": submission.url,
+        "created_utc": submission.created_utc,
+    }
+
+def ingest_subreddit(subreddit_name="onepiece", batch_size=10, flush_interval=30.0, max_pending=100,
+                     queue_file=QUEUE_FILE, state_file=STATE_FILE, offset_file=OFFSET_FILE, max_batches=None):
+    """
+    Continuously ingests new submissions from a subreddit's stream.
+
+    New posts are appended to queue_file (JSON lines) in micro-batches of up to
+    batch_size posts, or whatever has arrived after flush_interval seconds. After
+    every batch the cursor and seen-ID index are checkpointed, so a restart resumes
+    without re-emitting posts. When more than max_pending queued posts have not
+    been consumed by reply generation (see llm_handler.generate_replies_from_queue),
+    ingestion pauses until they are.
+    """
+    state = load_ingest_state(state_file)
+    seen = SeenIndex(state["seen_ids"])
+    cursor = state["cursor"]
+    written = state["written"]
+    batch = []
+    batch_started = None
+    batches = 0
+
+    def flush():
+        nonlocal batch, batch_started, cursor, written, batches
+        if not batch:
+            return
+        with open(queue_file, "a", encoding="utf-8") as f:
+            for post in batch:
+                f.write(json.dumps(post, ensure_ascii=False) + "\n")
+        newest = max(batch, key=lambda post: post["created_utc"])
+        if cursor is None or newest["created_utc"] >= cursor["created_utc"]:
+            cursor = {"created_utc": newest["created_utc"], "id": newest["id"]}
+        written += len(batch)
+        seen.compact()
+        _write_json_atomic({"cursor": cursor, "seen_ids": seen.to_list(), "written": written}, state_file)
+        print(f"📥 Queued {len(batch)} new posts ({written} total)")
+        batch = []
+        batch_started = None
+        batches += 1
+
+    reddit = _create_reddit()
+    print(f"📡 Streaming new posts from r/{subreddit_name} (Ctrl+C to stop)...")
+    if cursor:
+        print(f"↩️ Resuming after post {cursor['id']} ({len(seen)} seen IDs)")
+
+    try:
+        while max_batches is None or batches < max_batches:
+            try:
+                stream = reddit.subreddit(subreddit_name).stream.submissions(pause_after=0)
+                for submission in stream:
+                    if submission is not None:
+                        too_old = cursor and submission.created_utc < cursor["created_utc"] - CURSOR_GRACE_SECONDS
+                        if submission.id not in seen and not too_old:
+                            seen.add(submission.id)
+                            batch.append(_submission_to_post(submission))
+                            batch_started = batch_started or time.monotonic()
+
+                    if batch and (len(batch) >= batch_size or time.monotonic() - batch_started >= flush_interval):
+                        flush()
+                        if max_batches is not None and batches >= max_batches:
+                            return written
+
+                    if submission is None:
+                        # Backpressure: hold off while downstream generation is behind
+                        while written - load_queue_offset(offset_file)[0] >= max_pending:
+                            print(f"⏸️ {max_pending}+ queued posts are unprocessed, waiting for generation to catch up...")
+                            time.sleep(flush_interval)
+                        time.sleep(1)
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print(f"⚠️ Stream error: {e}. Reconnecting in 30s...")
+                time.sleep(30)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping ingest.")
+    finally:
+        flush()
+    return written
+
+def pending_ingested_count(state_file=STATE_FILE, offset_file=OFFSET_FILE):
+    """Returns how many queued posts have not been consumed by reply generation yet."""
+    return load_ingest_state(state_file)["written"] - load_queue_offset(offset_file)[0]
+
+def peek_ingested_posts(max_posts=50, queue_file=QUEUE_FILE, offset_file=OFFSET_FILE):
+    """
+    Returns up to max_posts unconsumed posts from the queue, and the offset to
+    pass to commit_ingested_posts once they have been processed.
+    """
+    consumed, byte_offset = load_queue_offset(offset_file)
+    posts = []
+    try:
+        with open(queue_file, "rb") as f:
+            f.seek(byte_offset)
+            while len(posts) < max_posts:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break # End of file, or a line still being written
+                posts.append(json.loads(line))
+                byte_offset = f.tell()
+    except FileNotFoundError:
+        return [], (consumed, byte_offset)
+    return posts, (consumed + len(posts), byte_offset)
+
+def commit_ingested_posts(offset, offset_file=OFFSET_FILE):
+    """Marks the posts returned by peek_ingested_posts as consumed, which also releases backpressure."""
+    consumed, byte_offset = offset
+    _write_json_atomic({"consumed": consumed, "byte_offset": byte_offset}, offset_file)
+
+if __name__ == "__main__":
+    ingest_subreddit(sys.argv[1] if len(sys.argv) > 1 else "onepiece")
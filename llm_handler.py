@@ -1,11 +1,193 @@
 import json
 import os
+import re
 import google.generativeai as genai
 from dotenv import load_dotenv
+from generation_client import HedgedGenerationClient
+from ingest import peek_ingested_posts, commit_ingested_posts
 load_dotenv()
 
+PRIMARY_MODEL = "gemini-1.5-flash"
+# Comma-separated list of models to hedge/fail over to, e.g. "gemini-1.5-flash-8b"
+FALLBACK_MODELS = [name.strip() for name in os.getenv("GEMINI_FALLBACK_MODELS", "").split(",") if name.strip()]
+
+# Per-prompt token budget; long post bodies are compacted to fit inside it.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "500"))
+LEAD_SENTENCES = 2
+# Share of the content budget that top comments (when scraped) may use.
+COMMENTS_BUDGET_SHARE = 0.4
+
+PROMPT_TEMPLATE = """You are a passionate One Piece fan who's witty, respectful, and knowledgeable. You respond with dignity and humor while staying authentic to your personality.
+
+**POST DETAILS:**
+Title: {title}
+Content: {content}
+URL: {url}
+Upvotes: {score}{comments}
+
+**RESPONSE GUIDELINES:**
+- Maximum 40 words
+- Be humorous and insightful
+- Show One Piece knowledge when relevant
+- Stay respectful but don't be afraid to give honest opinions
+- Sound natural and human, avoid generic responses
+- If post is question-based, provide helpful insight
+- If post is humorous, match the energy appropriately
+
+**Your Reply:**"""
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have",
+    "he", "her", "his", "i", "if", "in", "is", "it", "its", "just", "me", "my", "not", "of",
+    "on", "or", "so", "that", "the", "their", "them", "they", "this", "to", "was", "we",
+    "were", "what", "when", "which", "who", "will", "with", "you", "your",
+}
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+MD_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+MD_BLOCK_RE = re.compile(r"^\s*(#{1,6}|>+|[-*+]|\d+\.)\s+", re.MULTILINE)
+MD_INLINE_RE = re.compile(r"\*{1,3}|_{2,}|~~|`+|&amp;#x200B;|&nbsp;")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text):
+    """Roughly estimates the token count of a text (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def clean_post_text(text):
+    """Strips URLs and markdown noise from a post body."""
+    text = MD_LINK_RE.sub(r"\1", text)
+    text = URL_RE.sub("", text)
+    text = MD_BLOCK_RE.sub("", text)
+    text = MD_INLINE_RE.sub("", text)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def compact_post_text(text, token_budget, title=""):
+    """
+    Extractively truncates a post body to fit a token budget.
+    Keeps the lead sentences, then fills the remaining budget with the
+    highest-salience sentences, preserving their original order.
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    sentences = [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+    frequencies = {}
+    for word in WORD_RE.findall(text.lower()):
+        if word not in STOPWORDS:
+            frequencies[word] = frequencies.get(word, 0) + 1
+    title_words = set(WORD_RE.findall(title.lower())) - STOPWORDS
+
+    def salience(sentence):
+        words = [w for w in WORD_RE.findall(sentence.lower()) if w not in STOPWORDS]
+        if not words:
+            return 0.0
+        score = sum(frequencies.get(w, 0) for w in words) / len(words)
+        return score + 2 * len(title_words.intersection(words))
+
+    selected = set()
+    used = 0
+    ranked = list(range(min(LEAD_SENTENCES, len(sentences))))
+    ranked += sorted(range(len(ranked), len(sentences)), key=lambda i: salience(sentences[i]), reverse=True)
+    for i in ranked:
+        cost = estimate_tokens(sentences[i]) + 1
+        if used + cost > token_budget:
+            continue
+        selected.add(i)
+        used += cost
+
+    if not selected:
+        # Even the first sentence is over budget, so hard-cut it on a word boundary.
+        cut = sentences[0][:max(token_budget, 0) * 4].rsplit(" ", 1)[0] if sentences else ""
+        return cut + " …" if cut else ""
+    return " ".join(sentences[i] for i in sorted(selected)) + " …"
+
+
+def format_top_comments(comments, token_budget):
+    """Formats scraped top comments as a prompt section, keeping as many as fit the budget."""
+    lines = []
+    used = estimate_tokens("\nTop Comments:")
+    for comment in comments:
+        body = " ".join(clean_post_text(comment['body']).split())
+        line = f"- ({comment['score']} upvotes) {body}"
+        if used + estimate_tokens(line) > token_budget:
+            remaining = token_budget - used - 5
+            if remaining < 10:
+                break
+            line = f"- ({comment['score']} upvotes) {compact_post_text(body, remaining)}"
+            if used + estimate_tokens(line) > token_budget:
+                break
+        lines.append(line)
+        used += estimate_tokens(line) + 1
+    return "\nTop Comments:\n" + "\n".join(lines) if lines else ""
+
+
+def build_prompt(post, token_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Builds the reply prompt for a post, compacting the body (and any scraped
+    top comments) to the token budget.
+    Returns the prompt and the number of tokens saved by compaction.
+    """
+    raw_text = post['text'] if post['text'].strip() else ''
+    top_comments = post.get('top_comments') or []
+    template_tokens = estimate_tokens(PROMPT_TEMPLATE.format(
+        title=post['title'], content='', url=post['url'], score=post['score'], comments=''))
+    content_budget = max(token_budget - template_tokens, 0)
+
+    comments = format_top_comments(top_comments, int(content_budget * COMMENTS_BUDGET_SHARE)) if top_comments else ''
+    body_budget = content_budget - estimate_tokens(comments)
+
+    content = compact_post_text(clean_post_text(raw_text), body_budget, post['title'])
+    if not content:
+        content = '[No text content - check URL/image for context]'
+
+    prompt = PROMPT_TEMPLATE.format(title=post['title'], content=content, url=post['url'], score=post['score'],
+                                    comments=comments)
+    raw_comments = "".join(f"\n- ({c['score']} upvotes) {c['body']}" for c in top_comments)
+    full_prompt_tokens = estimate_tokens(PROMPT_TEMPLATE.format(
+        title=post['title'], content=raw_text, url=post['url'], score=post['score'], comments=raw_comments))
+    return prompt, max(full_prompt_tokens - estimate_tokens(prompt), 0)
+
 def generate_replies_from_file(filename="scraped_posts.json"):
     """Loads scraped posts and generates a reply for each using an LLM."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            posts = json.load(f)
+        print(f"📂 Loaded {len(posts)} posts from {filename}")
+    except FileNotFoundError:
+        print(f"❌ Error: The file '{filename}' was not found. Please run scraper.py first.")
+        return
+    except json.JSONDecodeError:
+        print(f"❌ Error: Invalid JSON format in {filename}")
+        return
+    return generate_replies(posts)
+
+def generate_replies_from_queue(max_posts=50):
+    """
+    Generates replies for the next batch of posts from the ingest queue.
+    The batch is only marked consumed once its replies are saved, so a failed
+    run leaves it queued for the next one.
+    """
+    posts, offset = peek_ingested_posts(max_posts)
+    if not posts:
+        print("ℹ️ No new ingested posts waiting.")
+        return []
+    print(f"📂 Loaded {len(posts)} ingested posts")
+    replies = generate_replies(posts)
+    if replies is not None:
+        commit_ingested_posts(offset)
+    return replies
+
+def generate_replies(posts, output_filename="posts_with_replies.json"):
+    """
+    Generates a reply for each post using an LLM and saves them to output_filename.
+    Returns the posts with replies, or None if generation could not run or the
+    replies could not be saved.
+    """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         print("❌ Error: GEMINI_API_KEY environment variable not found.")
@@ -14,49 +196,26 @@ def generate_replies_from_file(filename="scraped_posts.json"):
 
     try:
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        print("✅ Gemini API configured successfully.")
+        model_names = [PRIMARY_MODEL] + [name for name in FALLBACK_MODELS if name != PRIMARY_MODEL]
+        client = HedgedGenerationClient({name: genai.GenerativeModel(name) for name in model_names})
+        print(f"✅ Gemini API configured successfully ({', '.join(model_names)}).")
     except Exception as e:
         print(f"❌ Error configuring Gemini API: {e}")
         return
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            posts = json.load(f)
-        print(f"📂 Loaded {len(posts)} posts from {filename}")
-    except FileNotFoundError:
-        print(f"❌ Error: The file '{filename}' was not found. Please run scraper.py first.")
-        return
-    except json.JSONDecodeError:
-        print(f"❌ Error: Invalid JSON format in {filename}")
-        return
     generated_replies = []
+    total_tokens_saved = 0
     
     for i, post in enumerate(posts, 1):
         print("\n" + "=" * 60)
         print(f"📝 Processing post {i}/{len(posts)}: \"{post['title'][:50]}{'...' if len(post['title']) > 50 else ''}\"")
         
-        prompt = f"""You are a passionate One Piece fan who's witty, respectful, and knowledgeable. You respond with dignity and humor while staying authentic to your personality.
-
-**POST DETAILS:**
-Title: {post['title']}
-Content: {post['text'] if post['text'].strip() else '[No text content - check URL/image for context]'}
-URL: {post['url']}
-Upvotes: {post['score']}
-
-**RESPONSE GUIDELINES:**
-- Maximum 40 words
-- Be humorous and insightful
-- Show One Piece knowledge when relevant
-- Stay respectful but don't be afraid to give honest opinions
-- Sound natural and human, avoid generic responses
-- If post is question-based, provide helpful insight
-- If post is humorous, match the energy appropriately
-
-**Your Reply:**"""
+        prompt, tokens_saved = build_prompt(post)
+        total_tokens_saved += tokens_saved
+        if tokens_saved:
+            print(f"✂️ Compacted post body: saved ~{tokens_saved} tokens")
 
         try:
-            response = model.generate_content(prompt)
-            reply_text = response.text.strip()
+            reply_text = client.generate(prompt)
             
             print("🤖 Generated Reply:")
             print(f"   \"{reply_text}\"")
@@ -69,15 +228,26 @@ Upvotes: {post['score']}
         except Exception as e:
             print(f"❌ Could not generate reply for post ID {post['id']}: {e}")
             continue
+    client.close()
+    stats = client.stats()
+    if stats["p99_latency"] is not None:
+        print(f"\n⏱️ Generation latency p50: {stats['p50_latency']:.2f}s | p99: {stats['p99_latency']:.2f}s | "
+              f"hedges fired: {stats['hedges_fired']}/{stats['requests']} | "
+              f"timeouts: {stats['timeouts']} | failed: {stats['failed_requests']}")
+    if stats["open_circuits"]:
+        print(f"⚠️ Circuit open for: {', '.join(stats['open_circuits'])}")
+
     if generated_replies:
-        output_filename = "posts_with_replies.json"
         try:
             with open(output_filename, "w", encoding="utf-8") as f:
                 json.dump(generated_replies, f, indent=4, ensure_ascii=False)
             print(f"\n✅ Successfully saved {len(generated_replies)} posts with replies to {output_filename}")
         except Exception as e:
             print(f"❌ Error saving replies: {e}")
+            return
     
+    if total_tokens_saved:
+        print(f"\n✂️ Prompt compaction saved ~{total_tokens_saved} tokens in total")
     print("\n🎉 Reply generation completed!")
     return generated_replies
 
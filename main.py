@@ -6,30 +6,24 @@ import praw
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
+from outbox import enqueue_reply, dispatch_outbox, RedditAuthError
 
 load_dotenv()
 
-def post_comment_to_reddit(post_id, comment_text):
-    """Logs into Reddit using credentials from .env and posts a comment."""
-    print("\n🚀 Authenticating with Reddit to post...")
-    try:
-        reddit = praw.Reddit(
-            client_id=os.getenv("CLIENT_ID"),
-            client_secret=os.getenv("CLIENT_SECRET"),
-            user_agent=os.getenv("USER_AGENT"),
-            username=os.getenv("REDDIT_USERNAME"),
-            password=os.getenv("REDDIT_PASSWORD"),
-        )
-        
-        submission = reddit.submission(id=post_id)
-        new_comment = submission.reply(body=comment_text)
-        
-        print(f"✅ Successfully posted comment! Comment ID: {new_comment.id}")
-        return new_comment.id
-        
-    except Exception as e:
-        print(f"❌ An error occurred while posting to Reddit: {e}")
-        return None
+def login_to_reddit():
+    """
+    Returns a PRAW instance authenticated with the credentials from .env.
+    PRAW logs in lazily, so the credentials are checked here with user.me().
+    """
+    reddit = praw.Reddit(
+        client_id=os.getenv("CLIENT_ID"),
+        client_secret=os.getenv("CLIENT_SECRET"),
+        user_agent=os.getenv("USER_AGENT"),
+        username=os.getenv("REDDIT_USERNAME"),
+        password=os.getenv("REDDIT_PASSWORD"),
+    )
+    print(f"✅ Authenticated as: {reddit.user.me()}")
+    return reddit
 
 def track_comment(comment_id):
     """Saves the ID of a successfully posted comment to a CSV file for analysis."""
@@ -75,10 +69,11 @@ def review_and_post_workflow(filename="posts_with_replies.json"):
             choice = input("Choose an action: [a]ccept, [e]dit, [r]eject, [s]kip to next? ").lower()
 
             if choice == 'a':
-                print("✅ Reply accepted. Posting to Reddit...")
-                comment_id = post_comment_to_reddit(post['id'], current_reply)
-                if comment_id:
-                    track_comment(comment_id)
+                if enqueue_reply(post['id'], current_reply):
+                    print("✅ Reply accepted and queued for posting.")
+                else:
+                    print("ℹ️ This reply was already queued or posted for this post.")
+                break
 
             elif choice == 'e':
                 # Edit the reply
@@ -101,6 +96,20 @@ def review_and_post_workflow(filename="posts_with_replies.json"):
             else:
                 print("⚠️ Invalid choice. Please try again.")
 
+    print("\n🚀 Posting queued replies to Reddit...")
+    try:
+        reddit = login_to_reddit()
+    except Exception as e:
+        print(f"❌ Reddit authentication failed: {e}. Queued replies stay in the outbox for the next run.")
+    else:
+        try:
+            posted = dispatch_outbox(reddit, on_posted=lambda comment_id, post_id, reply_text: track_comment(comment_id))
+            print(f"📬 Posted {posted} queued replies.")
+        except RedditAuthError as e:
+            print(f"❌ {e}. Queued replies stay in the outbox for the next run.")
+        except Exception as e:
+            print(f"❌ Could not post queued replies: {e}. Pending replies stay in the outbox for the next run.")
+
     print("\n🎉 Review workflow completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+# model_registry.py
+
+import gc
+import os
+import time
+import threading
+
+# Models idle for longer than this are unloaded to give memory back.
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+REAPER_INTERVAL = 60
+
+_registry = {}
+_registry_lock = threading.Lock()
+_reaper_started = False
+
+def _model_memory_bytes(model):
+    """Estimates the memory held by a Hugging Face pipeline's weights."""
+    torch_model = getattr(model, "model", None)
+    if torch_model is None or not hasattr(torch_model, "parameters"):
+        return None
+    return sum(p.numel() * p.element_size() for p in torch_model.parameters())
+
+def _peak_rss_bytes():
+    """Returns the process's peak resident memory, where the platform reports it."""
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _current_rss_bytes():
+    """Returns the process's current resident memory, which drops when models are evicted."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class SharedModel:
+    """
+    A lazily loaded model shared by every caller in the process.
+    Calls are serialised with a lock, so one copy can serve many Streamlit sessions.
+    """
+
+    def __init__(self, name, loader, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.name = name
+        self.loader = loader
+        self.idle_timeout = idle_timeout
+        self._model = None
+        self._lock = threading.RLock()
+        self.load_seconds = None
+        self.loads = 0
+        self.calls = 0
+        self.memory_bytes = None
+        self.last_used = None
+
+    def ensure_loaded(self):
+        """Loads the model if it is not in memory. Returns False if loading failed."""
+        with self._lock:
+            if self._model is None:
+                start = time.monotonic()
+                model = self.loader()
+                if model is None:
+                    return False
+                self._model = model
+                self.load_seconds = time.monotonic() - start
+                self.loads += 1
+                self.memory_bytes = _model_memory_bytes(model)
+            self.last_used = time.monotonic()
+            return True
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            if not self.ensure_loaded():
+                raise RuntimeError(f"Model '{self.name}' could not be loaded.")
+            self.calls += 1
+            try:
+                return self._model(*args, **kwargs)
+            finally:
+                self.last_used = time.monotonic()
+
+    def evict(self):
+        """Drops the model from memory; the next call reloads it."""
+        self._evict_when(lambda: True)
+
+    def evict_if_idle(self):
+        """Drops the model if it has not been used for idle_timeout seconds."""
+        self._evict_when(lambda: time.monotonic() - self.last_used > self.idle_timeout)
+
+    def _evict_when(self, should_evict):
+        # Check and drop under one lock hold, so a call starting in between cannot lose its model
+        with self._lock:
+            if self._model is None or not should_evict():
+                return
+            self._model = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"♻️ Unloaded idle model '{self.name}'")
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def stats(self):
+        """Returns load state, load time, memory and usage counters for display."""
+        idle_seconds = time.monotonic() - self.last_used if self.last_used is not None else None
+        return {
+            "name": self.name,
+            "loaded": self.is_loaded,
+            "load_seconds": self.load_seconds,
+            "loads": self.loads,
+            "calls": self.calls,
+            "memory_bytes": self.memory_bytes if self.is_loaded else 0,
+            "idle_seconds": idle_seconds,
+        }
+
+def _reap_idle_models():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        with _registry_lock:
+            models = list(_registry.values())
+        for model in models:
+            model.evict_if_idle()
+
+def get_shared_model(name, loader, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Returns the process-wide SharedModel registered under name, creating it on first use."""
+    global _reaper_started
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = SharedModel(name, loader, idle_timeout)
+        if not _reaper_started:
+            threading.Thread(target=_reap_idle_models, name="model-reaper", daemon=True).start()
+            _reaper_started = True
+        return _registry[name]
+
+def get_sentiment_model():
+    """Returns the shared RoBERTa sentiment pipeline (loaded on first call)."""
+    from analysis import initialize_sentiment_pipeline
+    return get_shared_model("sentiment", initialize_sentiment_pipeline)
+
+def registry_stats():
+    """Returns stats for every registered model, plus the process's current and peak memory."""
+    with _registry_lock:
+        models = list(_registry.values())
+    return {
+        "models": [model.stats() for model in models],
+        "rss_bytes": _current_rss_bytes(),
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
@@ -0,0 +1,319 @@
+# outbox.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+import prawcore
+import requests
+from urllib3.exceptions import NewConnectionError
+from praw.exceptions import RedditAPIException
+from file_lock import locked
+
+OUTBOX_FILE = "posting_outbox.json"
+MAX_BACKOFF_SECONDS = 15 * 60
+# An entry still "sending" after this long was interrupted mid-request (e.g. a crash);
+# whether it reached Reddit is unknown, so it is never retried automatically.
+SENDING_TIMEOUT_SECONDS = 5 * 60
+AUTH_RETRY_SECONDS = 60
+# Errors that guarantee nothing was posted are retried with backoff up to this many attempts.
+MAX_ATTEMPTS = 8
+
+class RedditAuthError(Exception):
+    """Reddit rejected the credentials; the outbox is left untouched until they are fixed."""
+
+def reply_key(post_id, reply_text):
+    """Returns the idempotency key for a (post id, reply text) pair."""
+    digest = hashlib.sha256(f"{post_id}\n{reply_text.strip()}".encode("utf-8")).hexdigest()
+    return f"{post_id}:{digest[:16]}"
+
+def _load_outbox(filename):
+    """Loads the outbox entries keyed by reply key. Call only while holding locked()."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _save_outbox(entries, filename):
+    """Atomically rewrites the outbox file. Call only while holding locked()."""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_filename, filename)
+
+def _is_stale_sending(entry, now):
+    return entry["status"] == "sending" and now - entry.get("sending_since", 0) > SENDING_TIMEOUT_SECONDS
+
+def _needs_attention(entry, now):
+    return entry["status"] in ("failed", "unknown") or _is_stale_sending(entry, now)
+
+def enqueue_reply(post_id, reply_text, filename=OUTBOX_FILE):
+    """
+    Adds an accepted reply to the outbox. Accepting a reply again re-queues it
+    if its earlier attempt failed or ended in an unknown state.
+    Returns False if the same reply is already queued or posted for this post.
+    """
+    key = reply_key(post_id, reply_text)
+    with locked(filename):
+        entries = _load_outbox(filename)
+        if key in entries:
+            if not _needs_attention(entries[key], time.time()):
+                return False
+            _reset_entry(entries[key])
+            _save_outbox(entries, filename)
+            return True
+        entries[key] = {
+            "post_id": post_id,
+            "reply_text": reply_text,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": 0,
+            "queued_at": datetime.now().isoformat(),
+            "comment_id": None,
+            "error": None,
+        }
+        _save_outbox(entries, filename)
+    return True
+
+def _reset_entry(entry):
+    entry.update(status="pending", attempts=0, next_attempt_at=0, error=None)
+
+def requeue_reply(key, filename=OUTBOX_FILE):
+    """
+    Puts a failed or unknown entry back to "pending". Returns False if the entry
+    is missing or does not need attention. Check "unknown" replies on Reddit
+    first: they may have been posted.
+    """
+    with locked(filename):
+        entries = _load_outbox(filename)
+        entry = entries.get(key)
+        if entry is None or not _needs_attention(entry, time.time()):
+            return False
+        _reset_entry(entry)
+        _save_outbox(entries, filename)
+    return True
+
+def stuck_replies(filename=OUTBOX_FILE):
+    """Returns (key, entry) pairs for replies that failed or whose posting state is unknown."""
+    with locked(filename):
+        entries = _load_outbox(filename)
+    now = time.time()
+    return [
+        (key, dict(entry, status="unknown") if _is_stale_sending(entry, now) else entry)
+        for key, entry in entries.items() if _needs_attention(entry, now)
+    ]
+
+def outbox_summary(filename=OUTBOX_FILE):
+    """
+    Returns the number of outbox entries per status. "unknown" counts replies whose
+    posting was interrupted mid-request; check those on Reddit manually.
+    """
+    with locked(filename):
+        entries = _load_outbox(filename)
+    now = time.time()
+    summary = {"pending": 0, "sending": 0, "posted": 0, "failed": 0, "unknown": 0}
+    for entry in entries.values():
+        status = "unknown" if _is_stale_sending(entry, now) else entry["status"]
+        summary[status] = summary.get(status, 0) + 1
+    return summary
+
+def _ratelimit_delay(exception):
+    """Returns the wait in seconds requested by a RATELIMIT error, or None for other errors."""
+    for item in getattr(exception, "items", []):
+        if item.error_type != "RATELIMIT":
+            continue
+        match = re.search(r"(\d+)\s*(millisecond|ms|second|minute)", item.message or "")
+        if not match:
+            return 60.0
+        amount, unit = int(match.group(1)), match.group(2)
+        if unit == "minute":
+            return amount * 60.0
+        if unit in ("millisecond", "ms"):
+            return amount / 1000.0
+        return float(amount)
+    return None
+
+def _is_auth_error(error):
+    if isinstance(error, (prawcore.OAuthException, prawcore.InvalidToken)):
+        return True
+    return isinstance(error, prawcore.ResponseException) and error.response.status_code == 401
+
+def _sent_nothing(error):
+    """True for errors raised before the request could reach Reddit (or refused by it unprocessed)."""
+    if isinstance(error, (prawcore.Forbidden, prawcore.TooManyRequests)):
+        return True
+    # prawcore wraps transport errors; look at the underlying one
+    error = getattr(error, "original_exception", error)
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # Only a failure to open the connection is safe; "Connection aborted" may come after sending
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return isinstance(error, ConnectionError) and not isinstance(
+        error, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError))
+
+def _update_entry(key, filename, **changes):
+    """Applies changes to a single outbox entry and persists them."""
+    with locked(filename):
+        entries = _load_outbox(filename)
+        entries[key].update(changes)
+        _save_outbox(entries, filename)
+
+def _claim_next_entry(filename):
+    """
+    Atomically moves the next due entry from "pending" to "sending" and returns
+    (key, entry), or (None, earliest next_attempt_at) if nothing is due.
+    Stale "sending" entries are marked "unknown" on the way.
+    """
+    with locked(filename):
+        entries = _load_outbox(filename)
+        now = time.time()
+        changed = False
+        claimed = None
+        next_attempt_at = None
+        for key, entry in entries.items():
+            if _is_stale_sending(entry, now):
+                entry["status"] = "unknown"
+                entry["error"] = "Interrupted while posting; check Reddit before re-queueing."
+                changed = True
+            elif entry["status"] == "pending":
+                if claimed is None and entry["next_attempt_at"] <= now:
+                    entry.update(status="sending", sending_since=now, attempts=entry["attempts"] + 1)
+                    claimed = (key, dict(entry))
+                    changed = True
+                elif entry["next_attempt_at"] > now:
+                    next_attempt_at = min(next_attempt_at or entry["next_attempt_at"], entry["next_attempt_at"])
+        if changed:
+            _save_outbox(entries, filename)
+    return claimed or (None, next_attempt_at)
+
+def _defer_pending(key, filename, retry_at, error, hold_all=True):
+    """Puts an entry back until retry_at; with hold_all, every pending entry waits as well."""
+    with locked(filename):
+        entries = _load_outbox(filename)
+        entries[key]["status"] = "pending"
+        entries[key]["error"] = error
+        for entry in entries.values() if hold_all else [entries[key]]:
+            if entry["status"] == "pending":
+                entry["next_attempt_at"] = max(entry["next_attempt_at"], retry_at)
+        _save_outbox(entries, filename)
+
+def _backoff(attempts):
+    return min(5 * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+def dispatch_outbox(reddit, on_posted=None, filename=OUTBOX_FILE, wait=True):
+    """
+    Posts every pending outbox entry as fast as Reddit allows.
+
+    Each entry is claimed under an inter-process file lock, moving it from
+    "pending" to "sending" only if it is still pending on disk, so concurrent
+    dispatchers (e.g. the CLI and Streamlit) never post the same reply. Errors
+    that guarantee nothing was posted (rate limits, refused connections, 403/429)
+    put the entry back to "pending" with backoff; a rejection by Reddit marks it
+    "failed", and anything that may have reached Reddit (5xx, timeouts) marks it
+    "unknown", so a reply is never posted twice automatically.
+    Raises RedditAuthError, leaving the claimed entry pending, if the credentials
+    are rejected. on_posted(comment_id, post_id, reply_text) is called after each
+    success. With wait=True, sleeps through backoffs until the outbox is drained.
+    """
+    posted = 0
+    while True:
+        key, entry = _claim_next_entry(filename)
+        if key is None:
+            next_attempt_at = entry
+            if next_attempt_at is None or not wait:
+                return posted
+            time.sleep(max(next_attempt_at - time.time(), 0))
+            continue
+
+        try:
+            comment = reddit.submission(id=entry["post_id"]).reply(body=entry["reply_text"])
+        except RedditAPIException as e:
+            delay = _ratelimit_delay(e)
+            if delay is None:
+                _update_entry(key, filename, status="failed", error=str(e))
+                print(f"❌ Reddit rejected reply to post {entry['post_id']}: {e}")
+                continue
+            # The rate limit is per account, so hold back every pending entry.
+            backoff = min(max(delay, _backoff(entry["attempts"])), MAX_BACKOFF_SECONDS)
+            _defer_pending(key, filename, time.time() + backoff, str(e))
+            print(f"⏳ Rate limited by Reddit. Retrying in {backoff:.0f}s.")
+            continue
+        except Exception as e:
+            if _is_auth_error(e):
+                _update_entry(key, filename, status="pending", attempts=entry["attempts"] - 1, error=str(e))
+                raise RedditAuthError(f"Reddit rejected the credentials: {e}") from e
+            if _sent_nothing(e) and entry["attempts"] < MAX_ATTEMPTS:
+                backoff = _backoff(entry["attempts"])
+                # A 403 concerns only this post; connection errors and 429s hold back every entry
+                hold_all = not isinstance(e, prawcore.Forbidden)
+                _defer_pending(key, filename, time.time() + backoff, str(e), hold_all)
+                print(f"⏳ Reply to post {entry['post_id']} was not sent ({e}). Retrying in {backoff:.0f}s.")
+            elif _sent_nothing(e):
+                _update_entry(key, filename, status="failed", error=str(e))
+                print(f"❌ Giving up on reply to post {entry['post_id']} after {entry['attempts']} attempts: {e}")
+            else:
+                # The request may have reached Reddit; never retry it automatically.
+                _update_entry(key, filename, status="unknown", error=str(e))
+                print(f"⚠️ Posting to post {entry['post_id']} may or may not have succeeded: {e}")
+            continue
+
+        _update_entry(key, filename, status="posted", comment_id=comment.id, error=None)
+        posted += 1
+        print(f"✅ Successfully posted comment! Comment ID: {comment.id}")
+        if on_posted:
+            on_posted(comment.id, entry["post_id"], entry["reply_text"])
+
+class BackgroundDispatcher:
+    """
+    Daemon thread that keeps draining the outbox.
+    reddit_factory is retried until it returns an authenticated Reddit instance;
+    last_error holds the most recent authentication or dispatch failure for display.
+    """
+
+    def __init__(self, reddit_factory, on_posted=None, filename=OUTBOX_FILE, poll_interval=5.0):
+        self.reddit_factory = reddit_factory
+        self.on_posted = on_posted
+        self.filename = filename
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        reddit = None
+        while not self._stop_event.is_set():
+            if reddit is None:
+                try:
+                    reddit = self.reddit_factory()
+                except Exception as e:
+                    print(f"❌ Outbox dispatcher could not authenticate with Reddit: {e}")
+                if reddit is None:
+                    self.last_error = "Could not authenticate with Reddit; retrying."
+                    self._stop_event.wait(AUTH_RETRY_SECONDS)
+                    continue
+                self.last_error = None
+            try:
+                dispatch_outbox(reddit, self.on_posted, self.filename, wait=False)
+            except RedditAuthError as e:
+                reddit = None
+                self.last_error = f"{e}; retrying."
+                print(f"❌ {e}")
+                self._stop_event.wait(AUTH_RETRY_SECONDS)
+                continue
+            except Exception as e:
+                self.last_error = f"Outbox dispatcher error: {e}"
+                print(f"❌ {self.last_error}")
+            self._stop_event.wait(self.poll_interval)
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop_event.set()
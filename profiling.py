@@ -0,0 +1,176 @@
+# profiling.py
+
+import io
+import os
+import sys
+import time
+import pstats
+import itertools
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+PROFILE_ENV = "REDDIT_BOT_PROFILE"
+# "cprofile" (default) or "sampling" (pyinstrument, if installed)
+PROFILER_ENV = "REDDIT_BOT_PROFILER"
+# tracemalloc slows every allocation, inflating CPU times of allocation-heavy code;
+# set to 0 for undistorted timings without memory figures.
+PROFILE_MEMORY_ENV = "REDDIT_BOT_PROFILE_MEMORY"
+PROFILE_DIR = "profiles"
+TOP_N = 15
+
+# cProfile cannot run nested profilers in one thread, so inner stages pass through.
+_active = threading.local()
+_report_numbers = itertools.count(1)
+
+# tracemalloc is process-wide; concurrent stages (e.g. two Streamlit sessions) share it.
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+def profiling_enabled():
+    """Profiling is on with the --profile flag or REDDIT_BOT_PROFILE=1."""
+    return "--profile" in sys.argv or os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+def _memory_tracing_enabled():
+    return os.getenv(PROFILE_MEMORY_ENV, "1").lower() not in ("0", "false", "no")
+
+def _start_sampler():
+    """Starts pyinstrument's sampling profiler if it is installed."""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print("⚠️ pyinstrument is not installed; falling back to cProfile.")
+        return None
+    sampler = Profiler(async_mode="disabled")
+    sampler.start()
+    return sampler
+
+def _acquire_tracemalloc():
+    """Starts tracemalloc for the first concurrent stage; later stages share it."""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracemalloc_owned = True
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+def _release_tracemalloc():
+    """Returns (peak bytes, snapshot, shared) and stops tracemalloc after the last stage."""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        shared = _tracemalloc_users > 1
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+        return peak_bytes, snapshot, shared
+
+@contextmanager
+def profile_stage(name, top_n=TOP_N):
+    """
+    Profiles a block when profiling is enabled, otherwise does nothing.
+
+    Writes to profiles/<name>_<timestamp>_<pid>_<n>.*:
+      .prof  cProfile stats (open with snakeviz, or flameprof for a flamegraph)
+      .txt   wall time, peak memory, top functions and top allocation sites
+    and prints a top-N hotspot summary when the block finishes.
+
+    With REDDIT_BOT_PROFILER=sampling and pyinstrument installed, the sampling
+    profiler runs instead of cProfile and writes .speedscope.json / .html. The
+    two cannot run together: on Python <= 3.11 both install their hook through
+    PyEval_SetProfile, and the second one replaces the first.
+
+    Peak memory comes from the process-wide tracemalloc, so while stages overlap
+    (e.g. several Streamlit sessions), it covers all of them. tracemalloc also
+    inflates the measured CPU time of allocation-heavy code (JSON, tokenizers);
+    stages have side effects and cannot simply run twice, so for clean timings
+    run with REDDIT_BOT_PROFILE_MEMORY=0, which skips memory tracing.
+    """
+    if not profiling_enabled() or getattr(_active, "stage", None):
+        yield
+        return
+
+    _active.stage = name
+    trace_memory = _memory_tracing_enabled()
+    if trace_memory:
+        _acquire_tracemalloc()
+    sampler = _start_sampler() if os.getenv(PROFILER_ENV, "").lower() == "sampling" else None
+    profiler = None if sampler else cProfile.Profile()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        wall_seconds = time.perf_counter() - start
+        peak_bytes, snapshot, shared = _release_tracemalloc() if trace_memory else (None, None, False)
+        _active.stage = None
+        _write_reports(name, profiler, sampler, snapshot, wall_seconds, peak_bytes, shared, top_n)
+
+def _write_reports(name, profiler, sampler, snapshot, wall_seconds, peak_bytes, shared, top_n):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    # PID and a per-process counter keep reruns within the same second from overwriting reports
+    now = datetime.now()
+    base = os.path.join(PROFILE_DIR, f"{safe_name}_{now:%Y%m%d_%H%M%S}_{now.microsecond // 1000:03d}"
+                                     f"_{os.getpid()}_{next(_report_numbers)}")
+    if snapshot is None:
+        memory = "not traced (REDDIT_BOT_PROFILE_MEMORY=0)"
+        allocations = []
+    else:
+        memory = f"{peak_bytes / 1024 ** 2:.1f} MB peak traced memory"
+        if shared:
+            memory += " (shared with concurrent stages)"
+        allocations = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]).statistics("lineno")[:top_n]
+
+    with open(f"{base}.txt", "w", encoding="utf-8") as f:
+        f.write(f"Stage: {name}\nWall time: {wall_seconds:.3f}s\nMemory: {memory}\n")
+        if snapshot is not None:
+            f.write("Note: CPU times include tracemalloc overhead; "
+                    f"set {PROFILE_MEMORY_ENV}=0 for undistorted timings.\n")
+        f.write("\n")
+        if profiler:
+            hotspots = io.StringIO()
+            pstats.Stats(profiler, stream=hotspots).sort_stats("tottime").print_stats(top_n)
+            cumulative = io.StringIO()
+            pstats.Stats(profiler, stream=cumulative).sort_stats("cumulative").print_stats(top_n)
+            f.write(f"== Top {top_n} by own time ==\n{hotspots.getvalue()}\n")
+            f.write(f"== Top {top_n} by cumulative time ==\n{cumulative.getvalue()}\n")
+        else:
+            f.write(f"== Sampled call tree ==\n{sampler.output_text()}\n")
+        if allocations:
+            f.write(f"== Top {top_n} allocation sites ==\n")
+            f.writelines(f"{stat}\n" for stat in allocations)
+
+    print(f"\n⏱️ Profile for '{name}': {wall_seconds:.2f}s wall, {memory}")
+    if profiler:
+        profiler.dump_stats(f"{base}.prof")
+        stats = pstats.Stats(profiler)
+        print(f"🔥 Top {min(top_n, 10)} hotspots by own time:")
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:min(top_n, 10)]
+        for (filename, line, function), (_, calls, own_time, cumulative_time, _) in rows:
+            print(f"   {own_time:8.3f}s own {cumulative_time:8.3f}s cum {calls:>8} calls  "
+                  f"{function} ({os.path.basename(filename)}:{line})")
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        with open(f"{base}.speedscope.json", "w", encoding="utf-8") as f:
+            f.write(sampler.output(SpeedscopeRenderer()))
+        with open(f"{base}.html", "w", encoding="utf-8") as f:
+            f.write(sampler.output_html())
+        print("🔥 Sampled hotspots:")
+        print("\n".join(sampler.output_text().splitlines()[:top_n]))
+    print(f"📁 Reports written to {base}.*")
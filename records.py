@@ -0,0 +1,155 @@
+# records.py
+
+import csv
+import json
+import msgpack
+from operator import attrgetter
+from dataclasses import dataclass, fields, MISSING
+from typing import Optional
+
+FORMAT_NAME = "reddit-bot-records"
+FORMAT_VERSION = 1
+
+# Per-class field layout, computed once: dataclasses.fields() is too slow to call per record
+_layouts = {}
+
+def _layout(cls):
+    """Returns (field names, optional field names, getter for all field values) for a record class."""
+    layout = _layouts.get(cls)
+    if layout is None:
+        names = tuple(field.name for field in fields(cls))
+        optional = frozenset(field.name for field in fields(cls) if field.default is not MISSING)
+        layout = _layouts[cls] = (names, optional, attrgetter(*names))
+    return layout
+
+class Record:
+    """
+    Mixin for the slotted record dataclasses below.
+    Records are encoded in binary as a plain array of their field values.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def field_names(cls):
+        return list(_layout(cls)[0])
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a record from a dict, ignoring unknown keys."""
+        return cls(**{name: data[name] for name in _layout(cls)[0] if name in data})
+
+    def to_dict(self):
+        """Returns the record as a dict, leaving out optional fields that are unset."""
+        names, optional, values = _layout(type(self))
+        return {
+            name: value for name, value in zip(names, values(self))
+            if value is not None or name not in optional
+        }
+
+    def to_row(self):
+        """Returns the field values in declaration order (the binary encoding)."""
+        return _layout(type(self))[2](self)
+
+@dataclass(slots=True)
+class Post(Record):
+    """A scraped submission, as written by scraper.py and ingest.py."""
+    id: str
+    title: str
+    text: str
+    score: int
+    url: str
+    created_utc: Optional[float] = None
+    top_comments: Optional[list] = None
+
+@dataclass(slots=True)
+class GeneratedReply(Record):
+    """A scraped post plus the LLM reply generated for it by llm_handler.py."""
+    id: str
+    title: str
+    text: str
+    score: int
+    url: str
+    generated_reply: str
+    word_count: int
+    created_utc: Optional[float] = None
+    top_comments: Optional[list] = None
+
+@dataclass(slots=True)
+class TrackedComment(Record):
+    """A posted comment from tracked_comments.csv."""
+    comment_id: str
+    timestamp: str
+    post_id: Optional[str] = None
+    reply_text: Optional[str] = None
+
+RECORD_TYPES = {cls.__name__: cls for cls in (Post, GeneratedReply, TrackedComment)}
+
+# --- Binary (msgpack) serialization ---
+
+def write_records(filename, records, record_type):
+    """
+    Streams records to a msgpack file: a header map followed by one array per record.
+    Returns the number of records written.
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    count = 0
+    with open(filename, "wb") as f:
+        f.write(packer.pack({
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "type": record_type.__name__,
+            "fields": record_type.field_names(),
+        }))
+        for record in records:
+            f.write(packer.pack(record.to_row()))
+            count += 1
+    return count
+
+def iter_records(filename):
+    """Yields records from a msgpack file one at a time, without loading the whole file."""
+    with open(filename, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        header = next(unpacker, None)
+        if not isinstance(header, dict) or header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{filename} is not a {FORMAT_NAME} file")
+        record_type = RECORD_TYPES[header["type"]]
+        field_names = list(header["fields"])
+        if field_names == record_type.field_names():
+            for row in unpacker:
+                yield record_type(*row)
+        else:
+            # Written by a different schema version; map by field name
+            for row in unpacker:
+                yield record_type.from_dict(dict(zip(field_names, row)))
+
+def read_records(filename):
+    """Reads every record from a msgpack file into a list."""
+    return list(iter_records(filename))
+
+# --- JSON / CSV compatibility ---
+
+def import_json(filename, record_type):
+    """Loads a JSON list (e.g. scraped_posts.json) as records."""
+    with open(filename, "r", encoding="utf-8") as f:
+        return [record_type.from_dict(item) for item in json.load(f)]
+
+def export_json(filename, records):
+    """Writes records as an indented JSON list, in the same format as the pipeline's files."""
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump([record.to_dict() for record in records], f, indent=4, ensure_ascii=False)
+
+def import_tracked_comments(filename="tracked_comments.csv"):
+    """
+    Loads tracked_comments.csv as TrackedComment records. Handles both row layouts
+    in use: [comment_id, post_date] and [comment_id, post_id, reply_text, timestamp].
+    """
+    records = []
+    with open(filename, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None) # Skip header
+        for row in reader:
+            if len(row) >= 4:
+                records.append(TrackedComment(row[0], row[3], post_id=row[1], reply_text=row[2]))
+            elif len(row) >= 2:
+                records.append(TrackedComment(row[0], row[1]))
+    return records
@@ -2,13 +2,25 @@
 
 # Import the core functions from your other project files
 from scraper import scrape_subreddit
-from llm_handler import generate_replies_from_file
+from llm_handler import generate_replies_from_file, generate_replies_from_queue
+from ingest import pending_ingested_count
 from main import review_and_post_workflow
 from analysis import analyze_comment_performance, initialize_reddit, initialize_sentiment_pipeline
+from profiling import profile_stage, profiling_enabled
+from contextlib import nullcontext
 import csv
 import subprocess
 import sys
 
+# Menu actions profiled when run with --profile or REDDIT_BOT_PROFILE=1
+MENU_STAGES = {
+    '1': "menu_scrape",
+    '2': "menu_generate_replies",
+    '3': "menu_review_and_post",
+    '4': "menu_analyze_performance",
+    '5': "menu_full_workflow",
+}
+
 def show_menu():
     """Displays the main menu to the user."""
     print("\n" + "="*40)
@@ -25,76 +37,90 @@ def show_menu():
 
 def main():
     """The main driver function to run the project."""
+    if profiling_enabled():
+        print("⏱️ Profiling enabled: reports for each action are written to profiles/")
     while True:
         show_menu()
         choice = input("Enter your choice (1-7): ")
 
-        if choice == '1':
-            # Scrape a subreddit
-            subreddit_name = input("Enter the name of the subreddit to scrape (e.g., onepiece): ")
-            if not subreddit_name:
-                subreddit_name = "onepiece" # Default value
-            scrape_subreddit(subreddit_name)
+        stage = MENU_STAGES.get(choice)
+        with profile_stage(stage) if stage else nullcontext():
+            if choice == '1':
+                # Scrape a subreddit
+                subreddit_name = input("Enter the name of the subreddit to scrape (e.g., onepiece): ")
+                if not subreddit_name:
+                    subreddit_name = "onepiece" # Default value
+                scrape_subreddit(subreddit_name)
 
-        elif choice == '2':
-            # Generate LLM replies
-            print("\n--- Starting LLM Reply Generation ---")
-            generate_replies_from_file("scraped_posts.json")
+            elif choice == '2':
+                # Generate LLM replies
+                print("\n--- Starting LLM Reply Generation ---")
+                waiting = pending_ingested_count()
+                source = 's'
+                if waiting > 0:
+                    source = input(f"Generate from [s]craped_posts.json or the [i]ngest queue ({waiting} posts waiting)? ").lower()
+                if source == 'i':
+                    generate_replies_from_queue()
+                else:
+                    generate_replies_from_file("scraped_posts.json")
 
-        elif choice == '3':
-            # Review and post replies
-            print("\n--- Starting Interactive Review Workflow ---")
-            review_and_post_workflow("posts_with_replies.json")
+            elif choice == '3':
+                # Review and post replies
+                print("\n--- Starting Interactive Review Workflow ---")
+                review_and_post_workflow("posts_with_replies.json")
 
-        elif choice == '4':
-            # Analyze performance
-            print("\n--- Starting Performance Analysis ---")
-            reddit_instance = initialize_reddit()
-            sentiment_pipeline = initialize_sentiment_pipeline()
-            if reddit_instance and sentiment_pipeline:
-                try:
-                    with open('tracked_comments.csv', 'r', encoding='utf-8') as f:
-                        reader = csv.reader(f)
-                        next(reader) # Skip header
-                        for row in reader:
-                            if row:
-                                analyze_comment_performance(reddit_instance, sentiment_pipeline, row[0])
-                except FileNotFoundError:
-                    print("❌ 'tracked_comments.csv' not found. Post a comment first.")
-            print("\n🎉 Analysis complete!")
+            elif choice == '4':
+                # Analyze performance
+                print("\n--- Starting Performance Analysis ---")
+                reddit_instance = initialize_reddit()
+                sentiment_pipeline = initialize_sentiment_pipeline()
+                if reddit_instance and sentiment_pipeline:
+                    try:
+                        with open('tracked_comments.csv', 'r', encoding='utf-8') as f:
+                            reader = csv.reader(f)
+                            next(reader) # Skip header
+                            for row in reader:
+                                if row:
+                                    analyze_comment_performance(reddit_instance, sentiment_pipeline, row[0])
+                    except FileNotFoundError:
+                        print("❌ 'tracked_comments.csv' not found. Post a comment first.")
+                print("\n🎉 Analysis complete!")
 
-        elif choice == '5':
-            # Run the full end-to-end workflow
-            print("\n--- Running Full Workflow ---")
-            # Step 1
-            subreddit_name = input("Enter the name of the subreddit to scrape (e.g., onepiece): ")
-            if not subreddit_name:
-                subreddit_name = "onepiece"
-            scrape_subreddit(subreddit_name)
-            # Step 2
-            print("\n--- Starting LLM Reply Generation ---")
-            generate_replies_from_file("scraped_posts.json")
-            # Step 3
-            print("\n--- Starting Interactive Review Workflow ---")
-            review_and_post_workflow("posts_with_replies.json")
+            elif choice == '5':
+                # Run the full end-to-end workflow
+                print("\n--- Running Full Workflow ---")
+                # Step 1
+                subreddit_name = input("Enter the name of the subreddit to scrape (e.g., onepiece): ")
+                if not subreddit_name:
+                    subreddit_name = "onepiece"
+                scrape_subreddit(subreddit_name)
+                # Step 2
+                print("\n--- Starting LLM Reply Generation ---")
+                generate_replies_from_file("scraped_posts.json")
+                # Step 3
+                print("\n--- Starting Interactive Review Workflow ---")
+                review_and_post_workflow("posts_with_replies.json")
 
-        elif choice == '6':
-            # Launch Streamlit web interface
-            print("\n🌐 Launching Streamlit Web Interface...")
-            print("Opening in your default browser...")
-            try:
-                subprocess.run([sys.executable, "-m", "streamlit", "run", "streamlit_app.py"])
-            except Exception as e:
-                print(f"❌ Error launching Streamlit: {e}")
-                print("💡 Try running manually: streamlit run streamlit_app.py")
+            elif choice == '6':
+                # Launch Streamlit web interface
+                print("\n🌐 Launching Streamlit Web Interface...")
+                print("Opening in your default browser...")
+                try:
+                    command = [sys.executable, "-m", "streamlit", "run", "streamlit_app.py"]
+                    if profiling_enabled():
+                        command += ["--", "--profile"] # Profile each page in the Streamlit process
+                    subprocess.run(command)
+                except Exception as e:
+                    print(f"❌ Error launching Streamlit: {e}")
+                    print("💡 Try running manually: streamlit run streamlit_app.py")
 
-        elif choice == '7':
-            # Exit the program
-            print("👋 Exiting the control panel. Goodbye!")
-            break
+            elif choice == '7':
+                # Exit the program
+                print("👋 Exiting the control panel. Goodbye!")
+                break
 
-        else:
-            print("⚠️ Invalid choice. Please enter a number between 1 and 7.")
+            else:
+                print("⚠️ Invalid choice. Please enter a number between 1 and 7.")
 
 if __name__ == "__main__":
     main()
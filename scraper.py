@@ -4,6 +4,12 @@ import json
 
 import os
 
+import time
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
 from dotenv import load_dotenv
 
   
@@ -13,31 +19,118 @@ load_dotenv()
 
   
 
-def scrape_subreddit(subreddit_name="onepiece", limit=4):
-	"""Scrapes top posts from a given subreddit and saves them to a JSON file."""
+COMMENT_CACHE_FILE = "comment_cache.json"
+COMMENT_CACHE_TTL = 6 * 60 * 60 # Seconds before cached top comments are refetched
+
+_thread_local = threading.local()
+
+
+def _create_reddit():
+	"""Creates a read-only PRAW instance from the credentials in .env."""
+	return praw.Reddit(
+		client_id=os.getenv("CLIENT_ID"),
+		client_secret=os.getenv("CLIENT_SECRET"),
+		user_agent=os.getenv("USER_AGENT"),
+	)
 
+
+def _thread_reddit():
+	"""Returns a PRAW instance owned by the current thread (PRAW is not thread-safe)."""
+	if not hasattr(_thread_local, "reddit"):
+		_thread_local.reddit = _create_reddit()
+	return _thread_local.reddit
+
+
+def load_comment_cache(filename=COMMENT_CACHE_FILE):
+	"""Loads cached top comments keyed by post ID, dropping expired entries."""
 	try:
-		reddit = praw.Reddit(
-			client_id=os.getenv("CLIENT_ID"),
-			client_secret=os.getenv("CLIENT_SECRET"),
-			user_agent=os.getenv("USER_AGENT"),
-		)
+		with open(filename, "r", encoding="utf-8") as f:
+			cache = json.load(f)
+	except (FileNotFoundError, json.JSONDecodeError):
+		return {}
+	now = time.time()
+	return {post_id: entry for post_id, entry in cache.items() if now - entry["fetched_at"] < COMMENT_CACHE_TTL}
+
+
+def save_comment_cache(cache, filename=COMMENT_CACHE_FILE):
+	"""Saves the top comment cache."""
+	with open(filename, "w", encoding="utf-8") as f:
+		json.dump(cache, f, indent=4)
+
+
+def fetch_top_comments(post_id, top_n=5, replace_more_limit=0):
+	"""Fetches the top N top-level comments of a post with a shallow replace_more."""
+	submission = _thread_reddit().submission(id=post_id)
+	submission.comment_sort = "top"
+	submission.comment_limit = top_n
+	submission.comments.replace_more(limit=replace_more_limit)
+	return [
+		{
+			"author": comment.author.name if comment.author else "[deleted]",
+			"body": comment.body,
+			"score": comment.score
+		}
+		for comment in submission.comments[:top_n]
+	]
+
+
+def scrape_subreddit(subreddit_name="onepiece", limit=4, top_comments=0, max_workers=4):
+	"""
+	Scrapes top posts from a given subreddit and saves them to a JSON file.
+	With top_comments > 0, each post's top comments are fetched on a thread pool
+	while the listing is still being read, and attached as "top_comments".
+	"""
+
+	try:
+		reddit = _create_reddit()
 
 		subreddit = reddit.subreddit(subreddit_name)
 
 		print(f"🔎 Scraping recent {limit} posts from r/{subreddit_name}...")
 
 		recent_posts = []
-
-		for post in subreddit.new(limit=limit):
-			post_data = {
-				"id": post.id,
-				"title": post.title,
-				"text": post.selftext,
-				"score": post.score,
-				"url": post.url
-			}
-			recent_posts.append(post_data)
+		pending = {}
+		cache = load_comment_cache() if top_comments else {}
+		executor = ThreadPoolExecutor(max_workers=max_workers) if top_comments else None
+
+		try:
+			for post in subreddit.new(limit=limit):
+				post_data = {
+					"id": post.id,
+					"title": post.title,
+					"text": post.selftext,
+					"score": post.score,
+					"url": post.url
+				}
+				if top_comments:
+					cached = cache.get(post.id)
+					# A cached entry is usable if it asked for at least as many comments, or the post had fewer
+					if cached and (cached["requested"] >= top_comments or len(cached["comments"]) < cached["requested"]):
+						post_data["top_comments"] = cached["comments"][:top_comments]
+					else:
+						pending[post.id] = executor.submit(fetch_top_comments, post.id, top_comments)
+				recent_posts.append(post_data)
+		finally:
+			# Runs even if the listing fails, so fetched comments still reach the cache
+			if executor:
+				failed = 0
+				for post_data in recent_posts:
+					future = pending.get(post_data["id"])
+					if future is None:
+						continue
+					try:
+						comments = future.result()
+					except Exception as e:
+						print(f"⚠️ Could not fetch comments for post {post_data['id']}: {e}")
+						post_data["top_comments"] = []
+						failed += 1
+						continue
+					post_data["top_comments"] = comments
+					cache[post_data["id"]] = {"fetched_at": time.time(), "requested": top_comments, "comments": comments}
+				executor.shutdown()
+				save_comment_cache(cache)
+				print(f"💬 Attached top comments to {len(recent_posts)} posts ({len(pending) - failed} fetched, "
+					f"{len(recent_posts) - len(pending)} cached, {failed} failed)")
 
 		output_filename = "scraped_posts.json"
 		with open(output_filename, "w", encoding="utf-8") as f:
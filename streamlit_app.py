@@ -1,61 +1,47 @@
 # streamlit_app.py (Corrected and Unified)
 
 import streamlit as st
+import streamlit.components.v1 as components
 import os
 import csv
-import json
 import datetime
-import time # Added for better UI feedback
 from scraper import scrape_subreddit
-from llm_handler import generate_replies_from_file
-from analysis import analyze_comment_performance, initialize_reddit, initialize_sentiment_pipeline, visualize_reply_sentiment
+from llm_handler import generate_replies_from_file, generate_replies_from_queue
+from ingest import pending_ingested_count
+from profiling import profile_stage
+from model_registry import get_sentiment_model, registry_stats
+from outbox import enqueue_reply, outbox_summary, stuck_replies, requeue_reply, BackgroundDispatcher
+from heatmap_store import MAX_REPLY_CHARS
+from data_access import count_records, read_record, load_tracked_comment_ids
+from analysis import analyze_comment_performance, initialize_reddit, compute_word_importance, build_heatmap_html, render_heatmap_cached
 import praw # Added for performance dashboard
 
 # --- Utility Functions (from various files) ---
 
-def load_posts_with_replies(filename="posts_with_replies.json"):
-    """Load posts with replies from JSON file."""
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def save_tracked_comment(comment_id, post_id, reply_text):
-    """Save tracked comment to CSV file."""
+def append_tracked_comment(comment_id, post_id, reply_text):
+    """Append a posted comment to the tracking CSV file."""
     file_exists = os.path.exists('tracked_comments.csv')
-    try:
-        with open('tracked_comments.csv', 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(['comment_id', 'post_id', 'reply_text', 'timestamp'])
-            writer.writerow([comment_id, post_id, reply_text, datetime.datetime.now().isoformat()])
-        return True
-    except Exception as e:
-        st.error(f"Failed to save tracked comment: {e}")
-        return False
-
-def post_comment_to_reddit(reddit_instance, post_id, reply_text):
-    """Post comment to Reddit and return comment ID."""
-    try:
-        submission = reddit_instance.submission(id=post_id)
-        comment = submission.reply(reply_text)
-        return comment.id
-    except Exception as e:
-        st.error(f"❌ Error posting comment: {str(e)}")
-        return None
+    with open('tracked_comments.csv', 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(['comment_id', 'post_id', 'reply_text', 'timestamp'])
+        writer.writerow([comment_id, post_id, reply_text, datetime.datetime.now().isoformat()])
+
+@st.cache_resource
+def _start_outbox_dispatcher():
+    return BackgroundDispatcher(initialize_reddit, on_posted=append_tracked_comment)
+
+def get_outbox_dispatcher():
+    """Returns the background outbox dispatcher for this server process, restarting it if it died."""
+    dispatcher = _start_outbox_dispatcher()
+    if not dispatcher.is_alive():
+        _start_outbox_dispatcher.clear()
+        dispatcher = _start_outbox_dispatcher()
+    return dispatcher
 
 def load_tracked_comments(filename='tracked_comments.csv'):
-    """Loads the list of tracked comment IDs from the CSV file."""
-    if not os.path.exists(filename):
-        return []
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader) # Skip header
-            return [row[0] for row in reader if row]
-    except Exception:
-        return []
+    """Loads the list of tracked comment IDs from the CSV file (cached until the file changes)."""
+    return load_tracked_comment_ids(filename)
 
 # --- Streamlit Page Implementations ---
 
@@ -74,21 +60,19 @@ def page_home():
     with col2:
         st.subheader("📂 File Status")
         if os.path.exists("scraped_posts.json"):
-            try:
-                with open("scraped_posts.json", "r") as f:
-                    count = len(json.load(f))
+            count = count_records("scraped_posts.json")
+            if count is not None:
                 st.success(f"✅ `scraped_posts.json`: {count} posts loaded.")
-            except:
+            else:
                 st.error("❌ `scraped_posts.json`: Corrupted or empty.")
         else:
             st.warning("🟡 `scraped_posts.json`: Not found. Start by scraping.")
 
         if os.path.exists("posts_with_replies.json"):
-            try:
-                with open("posts_with_replies.json", "r") as f:
-                    count = len(json.load(f))
+            count = count_records("posts_with_replies.json")
+            if count is not None:
                 st.success(f"✅ `posts_with_replies.json`: {count} replies generated.")
-            except:
+            else:
                 st.error("❌ `posts_with_replies.json`: Corrupted or empty.")
         else:
             st.warning("🟡 `posts_with_replies.json`: Not found. Generate replies next.")
@@ -99,6 +83,25 @@ def page_home():
         else:
             st.warning("🟡 `tracked_comments.csv`: Not found. Post replies to start tracking.")
 
+        st.subheader("🧠 Shared Models")
+        stats = registry_stats()
+        if not stats["models"]:
+            st.info("No models loaded yet. The sentiment model loads on first use of the Performance Dashboard.")
+        for model in stats["models"]:
+            if model["loaded"]:
+                memory = f"{model['memory_bytes'] / 1024 ** 2:.0f} MB" if model["memory_bytes"] else "unknown size"
+                st.success(f"✅ `{model['name']}`: loaded in {model['load_seconds']:.1f}s, {memory}, "
+                           f"{model['calls']} calls, idle {model['idle_seconds']:.0f}s.")
+            else:
+                st.warning(f"💤 `{model['name']}`: not in memory (loaded {model['loads']} times, evicted when idle).")
+        memory = []
+        if stats["rss_bytes"]:
+            memory.append(f"Process memory: {stats['rss_bytes'] / 1024 ** 2:.0f} MB")
+        if stats["peak_rss_bytes"]:
+            memory.append(f"peak {stats['peak_rss_bytes'] / 1024 ** 2:.0f} MB")
+        if memory:
+            st.caption(" · ".join(memory))
+
 
 def page_scrape():
     """Page for scraping a subreddit."""
@@ -106,11 +109,13 @@ def page_scrape():
     with st.form("scrape_form"):
         subreddit_name = st.text_input("Subreddit Name (e.g., onepiece)", "onepiece")
         limit = st.number_input("Number of Posts to Scrape", 1, 50, 5)
+        top_comments = st.number_input("Top Comments to Fetch per Post (0 = off)", 0, 20, 0,
+                                       help="Gives the LLM more context, especially for image posts.")
         submitted = st.form_submit_button("🚀 Start Scraping", type="primary")
 
         if submitted and subreddit_name:
             with st.spinner(f"Scraping r/{subreddit_name}..."):
-                scrape_subreddit(subreddit_name, limit)
+                scrape_subreddit(subreddit_name, limit, top_comments=top_comments)
             st.success(f"Scraping complete! Check the status on the Home page.")
             st.balloons()
 
@@ -118,19 +123,30 @@ def page_scrape():
 def page_generate_replies():
     """Page for generating LLM replies."""
     st.header("🤖 Generate LLM Replies")
+    waiting = pending_ingested_count()
+    if waiting > 0:
+        st.info(f"📥 {waiting} ingested posts are waiting in the ingest queue.")
+        if st.button("🧠 Generate Replies for the Next Ingested Batch"):
+            with st.spinner("Generating replies... This may take a moment."):
+                replies = generate_replies_from_queue()
+            if replies is None:
+                st.error("Reply generation failed; the batch stays queued. See the console for details.")
+            else:
+                st.success(f"Reply generation complete! {len(replies)} replies saved to `posts_with_replies.json`.")
+        st.markdown("---")
+
     if not os.path.exists("scraped_posts.json"):
         st.warning("⚠️ No `scraped_posts.json` file found. Please scrape a subreddit first.")
         return
 
-    try:
-        with open("scraped_posts.json", "r") as f:
-            posts = json.load(f)
-        st.info(f"Found {len(posts)} posts to process.")
-        with st.expander("Click to preview first post"):
-            st.json(posts[0])
-    except Exception as e:
-        st.error(f"Could not read scraped posts: {e}")
+    count = count_records("scraped_posts.json")
+    if count is None:
+        st.error("Could not read scraped posts: file is corrupted or not a JSON list.")
         return
+    st.info(f"Found {count} posts to process.")
+    if count:
+        with st.expander("Click to preview first post"):
+            st.json(read_record("scraped_posts.json", 0))
 
     if st.button("🧠 Generate Replies Now", type="primary"):
         with st.spinner("Generating replies... This may take a moment."):
@@ -142,9 +158,11 @@ def page_generate_replies():
 def page_review_and_post():
     """Page for reviewing and posting replies with full controls."""
     st.header("✏️ Review & Post Replies")
-    posts = load_posts_with_replies() #
+    # Posts are paged in one at a time from a cached offset index
+    replies_file = "posts_with_replies.json"
+    total_posts = count_records(replies_file) or 0
 
-    if not posts:
+    if not total_posts:
         st.warning("⚠️ No replies found. Please generate replies first on the 'Generate Replies' page.") #
         return
 
@@ -160,8 +178,27 @@ def page_review_and_post():
         st.error("Could not connect to Reddit. Check your credentials in `.env` file.") #
         return
 
+    # Accepted replies are posted by the background dispatcher
+    dispatcher = get_outbox_dispatcher()
+    if dispatcher.last_error:
+        st.error(f"📬 Accepted replies are not being posted: {dispatcher.last_error}")
+    summary = outbox_summary()
+    st.caption(f"📬 Outbox: {summary['pending'] + summary['sending']} queued · {summary['posted']} posted · {summary['failed']} failed")
+    if summary['unknown']:
+        st.warning(f"⚠️ {summary['unknown']} replies may or may not have been posted and need a manual check on Reddit "
+                   "before retrying.")
+    if summary['failed'] or summary['unknown']:
+        with st.expander("📬 Replies that were not posted"):
+            for key, entry in stuck_replies():
+                st.markdown(f"**Post `{entry['post_id']}`** · {entry['status']} · {entry.get('error') or ''}")
+                st.text(entry['reply_text'])
+                label = "🔁 Retry" if entry['status'] == "failed" else "🔁 Not on Reddit, retry"
+                if st.button(label, key=f"requeue_{key}"):
+                    requeue_reply(key)
+                    st.rerun()
+
     # Check if we are done reviewing
-    if st.session_state.review_index >= len(posts):
+    if st.session_state.review_index >= total_posts:
         st.success("🎉 All posts have been reviewed!") #
         if st.button("Start Over"):
             st.session_state.review_index = 0 #
@@ -171,9 +208,12 @@ def page_review_and_post():
 
     # Display current post for review
     idx = st.session_state.review_index
-    post = posts[idx]
-    st.progress((idx + 1) / len(posts)) #
-    st.caption(f"Reviewing Post {idx + 1} of {len(posts)}") #
+    post = read_record(replies_file, idx)
+    if post is None:
+        st.error("Could not read this post from `posts_with_replies.json`.")
+        return
+    st.progress((idx + 1) / total_posts) #
+    st.caption(f"Reviewing Post {idx + 1} of {total_posts}") #
 
     with st.container(border=True):
         st.subheader(post['title'])
@@ -203,14 +243,12 @@ def page_review_and_post():
     # Column 1: Accept & Post button
     with col1:
         if st.button("✅ Accept & Post", type="primary", use_container_width=True):
-            with st.spinner("Posting to Reddit..."):
-                comment_id = post_comment_to_reddit(st.session_state.reddit, post['id'], edited_reply) #
-            if comment_id:
-                save_tracked_comment(comment_id, post['id'], edited_reply) #
-                st.success(f"Posted successfully! Comment ID: {comment_id}") #
-                st.session_state.review_index += 1 #
-                time.sleep(2) 
-                st.rerun()
+            if enqueue_reply(post['id'], edited_reply):
+                st.toast("Reply queued for posting.")
+            else:
+                st.toast("This reply was already queued or posted.")
+            st.session_state.review_index += 1 #
+            st.rerun()
 
     # Column 2: Reset to Original (the new "Edit") button
     with col2:
@@ -235,12 +273,13 @@ def page_performance_dashboard():
         st.session_state.reddit = initialize_reddit()
     reddit = st.session_state.reddit
 
-    if 'sentiment_pipeline' not in st.session_state:
+    # One model copy is shared by every session in this process
+    sentiment_analyzer = get_sentiment_model()
+    if not sentiment_analyzer.is_loaded:
         with st.spinner("Loading sentiment analysis model..."):
-            st.session_state.sentiment_pipeline = initialize_sentiment_pipeline()
-    sentiment_analyzer = st.session_state.sentiment_pipeline
+            sentiment_analyzer.ensure_loaded()
 
-    if not reddit or not sentiment_analyzer:
+    if not reddit or not sentiment_analyzer.is_loaded:
         st.error("Could not initialize Reddit or Sentiment model. Check console for errors.")
         return
 
@@ -249,6 +288,8 @@ def page_performance_dashboard():
         st.info("No tracked comments found. Post a comment from the 'Review & Post' page first.")
         return
 
+    render_mode = st.radio("Heatmap rendering", ["Interactive (browser)", "PNG (server-side)"], horizontal=True)
+
     st.success(f"Found {len(comment_ids)} tracked comments to analyze.")
     for comment_id in reversed(comment_ids): # Show most recent first
         try:
@@ -274,16 +315,29 @@ def page_performance_dashboard():
                         st.write(f"**Reply from {author}:**")
                         st.write(f"> {reply.body}")
 
-                        # Generate and display sentiment heatmap
-                        heatmap_filename = f"heatmaps/heatmap_{comment_id}_{reply.id}.png"
-                        os.makedirs("heatmaps", exist_ok=True) # Ensure directory exists
-                        
-                        visualize_reply_sentiment(reply.body, sentiment_analyzer, heatmap_filename)
-                        
-                        if os.path.exists(heatmap_filename):
-                            st.image(heatmap_filename)
-                        else:
+                        # Score the reply once, then draw the heatmap in the browser
+                        # Score and store the same (truncated) text that analysis.py uses
+                        reply_text = reply.body[:MAX_REPLY_CHARS]
+                        try:
+                            importance = compute_word_importance(reply_text, sentiment_analyzer)
+                        except Exception:
+                            importance = None
+                        if not importance:
                             st.warning("Could not generate sentiment heatmap for this reply.")
+                            continue
+                        words, scores, _ = importance
+
+                        if render_mode == "PNG (server-side)":
+                            # Identical renders are served from the heatmap store
+                            st.image(render_heatmap_cached(reply_text, words, scores))
+                        else:
+                            components.html(build_heatmap_html(words, scores), height=60 + 40 * (len(words) // 12 + 1))
+                            if st.button("🖼️ Export PNG", key=f"export_{comment_id}_{reply.id}"):
+                                heatmap_filename = render_heatmap_cached(reply_text, words, scores)
+                                with open(heatmap_filename, "rb") as f:
+                                    st.download_button("⬇️ Download PNG", f.read(),
+                                                       file_name=f"heatmap_{comment_id}_{reply.id}.png",
+                                                       mime="image/png", key=f"download_{comment_id}_{reply.id}")
 
         except Exception as e:
             st.error(f"Could not fetch data for comment {comment_id}: {e}")
@@ -307,8 +361,10 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.info("This app automates scraping, replying, and analyzing Reddit engagement.")
 
-    # Call the selected page's function
-    page_options[page_selection]()
+    # Call the selected page's function (profiled when launched with -- --profile or REDDIT_BOT_PROFILE=1)
+    page_function = page_options[page_selection]
+    with profile_stage(page_function.__name__):
+        page_function()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file